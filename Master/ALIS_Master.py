@@ -6,7 +6,11 @@
 import os
 
 from Modules.MasterFileHandler import FileHandler
-from Modules.TrainNN import trainNSaveRNN
+from Modules.CorpusBuilder import CorpusBuilder
+from Modules.TrainNN import trainNSaveRNN, resumeTraining
+from Modules.DistributedTrain import launchDistributed
+from Modules.QuantizeNet import exportQuantized, quantizationReport
+from Modules.ExportNet import exportSamplingStep, exportNumpy
 
 
 class ALIS_Trainer:
@@ -62,22 +66,11 @@ class ALIS_Trainer:
         print('')
 
 
-    def createNSaveTrainingSet(self, midi_set):
-        '''Creates and saves the training data set out of every midi file in *midi_set* directory'''
+    def createNSaveTrainingSet(self, midi_set, text_format='notes'):
+        '''Creates and saves the training data set out of every midi file in *midi_set* directory, in *text_format*'''
 
-        training_set_text = ''
-        directory = r'Midi_training_data/{}'.format(midi_set)
-        for filename in os.listdir(directory):
-            if filename.endswith(".mid"):
-                filer = FileHandler(r'{}/{}'.format(directory, filename), 'x.txt')
-                training_set_text = training_set_text + '### ' + filer.midiToText() # Note information for every solo seperated by '###'
-            else:
-                continue
-        print('')
-        training_set_text = training_set_text + '###'
-
-        filer2 = FileHandler('x.txt', '{}.txt'.format(midi_set))
-        filer2.writeTextToFile(training_set_text)
+        builder = CorpusBuilder(midi_set, text_format=text_format) # Encodes new or changed midi files in parallel and reuses the rest
+        builder.build()
 
 
     def deleteFile(self, directory, filename):
@@ -97,6 +90,10 @@ class ALIS_Trainer:
         print('2: Train network on training set...')
         print('3: Delete training set...')
         print('4: Delete network...')
+        print('5: Resume training from checkpoint...')
+        print('6: Train network across several processes or machines...')
+        print('7: Export quantized network for faster generation...')
+        print('8: Export compiled sampling step or NumPy weights for faster generation...')
         print('X: Quit')
         print('')
         print('Enter value to proceed with task.')
@@ -114,6 +111,14 @@ class ALIS_Trainer:
             self.deleteTrainingSet()
         elif choice == '4':
             self.deleteNet()
+        elif choice == '5':
+            self.resumeFromCheckpoint()
+        elif choice == '6':
+            self.setUpDistributedTraining()
+        elif choice == '7':
+            self.quantizeNet()
+        elif choice == '8':
+            self.exportNet()
         elif choice == 'X':
             self.turn_ALIS_off()
         else:
@@ -133,7 +138,9 @@ class ALIS_Trainer:
                 midi_training_set = input('Directory: ')
                 if midi_training_set == 'x':
                     break
-                self.createNSaveTrainingSet(midi_training_set)
+                # Events take about a third of the characters a note, so nets train and sample on shorter sequences
+                use_events = input('Encode each note as 3 event characters instead of note text? (y/n) ') == 'y'
+                self.createNSaveTrainingSet(midi_training_set, 'events' if use_events else 'notes')
                 valid_midi_training_set = True
             except:   
                 print('Directory not found. Please enter valid directory from the {} directory.'.format(directory))
@@ -153,10 +160,129 @@ class ALIS_Trainer:
                     break
                 trainNSaveRNN(training_set)
                 valid_training_set = True
+            except KeyboardInterrupt:
+                print('Training stopped.')
+                break
             except:
                 print('Training set not found. Please enter valid file name from the {} directory.'.format(directory))
 
 
+    def resumeFromCheckpoint(self):
+        '''UI for resuming an interrupted training run'''
+
+        directory = 'Checkpoints'
+        if not os.path.isdir(directory):
+            print('No checkpoints found in {}.'.format(directory))
+            return
+        print('Choose checkpoint to resume training from: (\'x\' to cancel)')
+        self.displayContents(directory)
+        valid_checkpoint = False
+        while not valid_checkpoint:
+            try:
+                checkpoint = input('Checkpoint: ')
+                if checkpoint == 'x':
+                    break
+                resumeTraining(checkpoint)
+                valid_checkpoint = True
+            except KeyboardInterrupt:
+                print('Training stopped.')
+                break
+            except:
+                print('Checkpoint not found. Please enter valid file name from the {} directory.'.format(directory))
+
+
+    def askPositiveInt(self, question, default=None):
+        '''Asks *question* until a positive whole number is entered and returns it (Enter gives *default* if set)'''
+
+        while True:
+            answer = input(question)
+            if answer == '' and default is not None:
+                return default
+            if answer.isdigit() and int(answer) > 0:
+                return int(answer)
+            print('Please enter a whole number greater than 0.')
+
+
+    def askIndex(self, question, count):
+        '''Asks *question* until a whole number from 0 to *count* - 1 is entered and returns it'''
+
+        while True:
+            answer = input(question)
+            if answer.isdigit() and int(answer) < count:
+                return int(answer)
+            print('Please enter a whole number from 0 to {}.'.format(count - 1))
+
+
+    def setUpDistributedTraining(self):
+        '''UI for training a network model with data-parallel workers'''
+
+        directory = 'Training_sets'
+        print('Choose training set to use for training: (\'x\' to cancel)')
+        self.displayContents(directory)
+        training_set = input('Training set: ')
+        if training_set == 'x':
+            return
+        if not os.path.isfile(os.path.join(directory, training_set)):
+            print('Training set not found.')
+            return
+        epochs = self.askPositiveInt('Enter number of epochs: ')
+        procs = self.askPositiveInt('Worker processes on this machine: (Enter for {}) '.format(max(1, (os.cpu_count() or 1) // 4)),
+                                    max(1, (os.cpu_count() or 1) // 4))
+        n_nodes = self.askPositiveInt('Number of machines taking part: (Enter for 1) ', 1)
+        node_rank, master_addr = 0, '127.0.0.1'
+        if n_nodes > 1:
+            node_rank = self.askIndex('Index of this machine (0 for the machine saving the net): ', n_nodes)
+            master_addr = input('Address of machine 0: ')
+        use_embedding = input('Feed characters through an embedding instead of one-hot vectors? (y/n) ') == 'y'
+        try:
+            launchDistributed(training_set, epochs, procs_per_node=procs, n_nodes=n_nodes, node_rank=node_rank,
+                              master_addr=master_addr, use_embedding=use_embedding)
+        except KeyboardInterrupt:
+            print('Training stopped.')
+
+
+    def quantizeNet(self):
+        '''UI for exporting an int8 or float16 version of a network model'''
+
+        directory = 'Nets'
+        print('Choose net to export a quantized version of: (\'x\' to cancel)')
+        self.displayContents(directory)
+        net = input('Net: ')
+        if net == 'x':
+            return
+        if not os.path.isfile(os.path.join(directory, net)):
+            print('Net not found.')
+            return
+        mode = input('Quantize weights to int8 or float16? (i/f) ')
+        exportQuantized(net, 'fp16' if mode == 'f' else 'int8')
+        if input('Compare speed, size, memory and sampled notes with the original net? (y/n) ') == 'y':
+            quantizationReport(net, modes=('fp16',) if mode == 'f' else ('int8',))
+
+
+    def exportNet(self):
+        '''UI for exporting the sampling step of a network model as a TorchScript module, or its weights for NumPy'''
+
+        directory = 'Nets'
+        print('Choose net (or quantized version of one) to export: (\'x\' to cancel)')
+        self.displayContents(directory)
+        valid_net = False
+        while not valid_net:
+            try:
+                net = input('Net: ')
+                if net == 'x':
+                    break
+                if input('Export TorchScript sampling step or NumPy weights (for running without PyTorch)? (t/n) ') == 'n':
+                    exportNumpy(net)
+                else:
+                    exportSamplingStep(net)
+                valid_net = True
+            except FileNotFoundError:
+                print('Net not found. Please enter valid net name from the {} directory.'.format(directory))
+            except ValueError as err:
+                print(err)
+                break
+
+
     def deleteTrainingSet(self):
         '''UI for deleting a training set'''
 
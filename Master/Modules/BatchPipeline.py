@@ -0,0 +1,94 @@
+'''
+    Zero-copy batch views and background prefetching for training
+'''
+
+import queue
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+def batchViews(arr, n_seqs, n_steps):
+    '''
+    Returns (x, y) views of *arr* with shape n_batches x n_seqs x n_steps, without copying any data.
+    Rows are laid out as in get_batches, and every target is the character following its input,
+    so one character is held back at the end of *arr* for the final target.
+
+    Arguments:
+        arr: Array you want to make batches from
+        n_seqs: Batch size, the number of sequences per batch
+        n_steps: Number of sequence steps per batch
+    '''
+
+    batch_size = n_seqs * n_steps
+    n_batches = (len(arr) - 1) // batch_size
+    row_len = n_batches * n_steps # Characters in each of the n_seqs rows
+    item = arr.strides[0]
+    shape = (n_batches, n_seqs, n_steps)
+    strides = (n_steps * item, row_len * item, item)
+    x = as_strided(arr[:n_batches * batch_size], shape=shape, strides=strides, writeable=False)
+    y = as_strided(arr[1:n_batches * batch_size + 1], shape=shape, strides=strides, writeable=False)
+    return x, y
+
+
+def prefetchBatches(arr, n_seqs, n_steps, prepare=None, depth=4):
+    '''
+    Create a generator that returns batches of size n_seqs x n_steps from arr, like get_batches.
+    A background thread runs *prepare* on each (x, y) and keeps up to *depth* prepared batches ready.
+
+    Arguments:
+        arr: Array you want to make batches from
+        n_seqs: Batch size, the number of sequences per batch
+        n_steps: Number of sequence steps per batch
+        prepare: function turning (x, y) into whatever the training loop consumes (None yields (x, y) as is)
+        depth: Number of batches prepared ahead of the training loop
+    '''
+
+    xs, ys = batchViews(arr, n_seqs, n_steps)
+    return prefetchItems((prepare(x, y) if prepare is not None else (x, y) for x, y in zip(xs, ys)), depth)
+
+
+def prefetchItems(items, depth=4):
+    '''
+    Create a generator that returns every item of the iterable *items* in order,
+    while a background thread keeps up to *depth* items ready. Any exception raised by *items* is raised in the caller.
+    '''
+
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object() # Marks the end of the batches
+
+    def hand(item):
+        '''Puts *item* in the queue once there is room, returning False instead if the training loop stopped first'''
+
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        '''Prepares every batch in order, handing over any exception to the training loop'''
+
+        try:
+            for item in items:
+                if not hand(item):
+                    return
+            hand(done)
+        except Exception as err:
+            hand(err)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set() # Lets the worker finish if the loop stops early
@@ -0,0 +1,165 @@
+'''
+    Timing, saving and baseline comparison of benchmark results, shared by MasterBenchmark and UserBenchmark.
+    Kept identical in the Master and User so both suites write and compare results the same way.
+
+    A results file is JSON with sorted keys:
+        {"version": 1, "suite": "master", "environment": {...},
+         "benchmarks": {"<name>": {"value": v, "unit": "s/step", "higher_is_better": false, "tolerance": 0.25,
+                                   "repeats": n, "detail": {...}}}}
+    A benchmark fails against a baseline when it is worse than the baseline value by more than the baseline's
+    *tolerance*, a fraction, so thresholds are tuned by editing the stored baseline.
+'''
+
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+try:
+    import torch
+except ImportError: # The User may run without PyTorch
+    torch = None
+
+
+RESULTS_VERSION = 1 # Bump whenever the layout of a results file changes
+DEFAULT_TOLERANCE = 0.25 # A benchmark may be up to 25% worse than its baseline
+
+
+def timeRepeats(function, repeats=5, warmup=1):
+    '''Returns the seconds each of *repeats* calls of *function* took, after *warmup* untimed calls'''
+
+    for _ in range(warmup):
+        function()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def significant(value, digits=6):
+    '''Returns *value* rounded to *digits* significant digits, so results files do not change with float noise'''
+
+    if isinstance(value, float) and value != 0 and np.isfinite(value):
+        return round(value, digits - 1 - int(np.floor(np.log10(abs(value)))))
+    return value
+
+
+def benchmark(value, unit, higher_is_better=False, tolerance=DEFAULT_TOLERANCE, repeats=1, detail=None):
+    '''Returns the result of one benchmark, the *value* it is compared by and how to compare it'''
+
+    detail = {key: significant(item) for key, item in (detail or {}).items()}
+    return {'value': significant(float(value)), 'unit': unit, 'higher_is_better': higher_is_better,
+            'tolerance': tolerance, 'repeats': repeats, 'detail': detail}
+
+
+def environment():
+    '''Returns the versions and machine the benchmarks ran on, for telling apart results from different setups'''
+
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'torch': torch.__version__ if torch is not None else None,
+            'torch_threads': torch.get_num_threads() if torch is not None else None,
+            'machine': platform.machine(), 'system': platform.system(), 'cpus': os.cpu_count()}
+
+
+def results(suite, benchmarks):
+    '''Returns the results file contents of *suite* for the dictionary *benchmarks* of benchmark() results'''
+
+    return {'version': RESULTS_VERSION, 'suite': suite, 'environment': environment(), 'benchmarks': benchmarks}
+
+
+def saveResults(report, path):
+    '''Saves the results *report* to *path* as JSON with sorted keys'''
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as results_file:
+        json.dump(report, results_file, indent=2, sort_keys=True)
+        results_file.write('\n')
+
+
+def loadResults(path):
+    '''Returns the results saved at *path*'''
+
+    with open(path, 'r') as results_file:
+        return json.load(results_file)
+
+
+def compareResults(report, baseline):
+    '''
+    Returns a row (name, baseline value, value, change, passed) for every benchmark of *baseline* and every new one of
+    *report*. *change* is how much worse the value is than the baseline as a fraction (negative when better),
+    None for a benchmark without a baseline, which passes, or missing from *report*, which fails.
+    '''
+
+    rows = []
+    for name, base in sorted(baseline['benchmarks'].items()):
+        current = report['benchmarks'].get(name)
+        if current is None:
+            rows.append((name, base['value'], None, None, False))
+            continue
+        if base['higher_is_better']:
+            change = base['value'] / max(current['value'], 1e-12) - 1
+        else:
+            change = current['value'] / max(base['value'], 1e-12) - 1
+        rows.append((name, base['value'], current['value'], change, change <= base.get('tolerance', DEFAULT_TOLERANCE)))
+    for name, current in sorted(report['benchmarks'].items()):
+        if name not in baseline['benchmarks']:
+            rows.append((name, None, current['value'], None, True))
+    return rows
+
+
+def printResults(report, rows=None):
+    '''Prints every benchmark of *report* with its comparison from *rows* if given'''
+
+    compared = {row[0]: row for row in rows or []}
+    print('')
+    print('{:<32}{:>14}{:>14}{:>10}  {}'.format('Benchmark', 'Baseline', 'Value', 'Change', 'Unit'))
+    for name in sorted(set(report['benchmarks']) | set(compared)):
+        unit = report['benchmarks'].get(name, {}).get('unit', '')
+        _, base, value, change, passed = compared.get(name, (name, None, report['benchmarks'][name]['value'], None, True))
+        print('{:<32}{:>14}{:>14}{:>10}  {}{}'.format(name, '-' if base is None else '{:.6g}'.format(base),
+                                                      'missing' if value is None else '{:.6g}'.format(value),
+                                                      '-' if change is None else '{:+.1%}'.format(change),
+                                                      unit, '' if passed else '  FAIL'))
+
+
+def runSuite(suite, benchmarks, results_dir='Benchmarks', save_baseline=False):
+    '''
+    Runs *benchmarks*, a function returning the dictionary of benchmark() results, saves them to
+    *results_dir*/<suite>.results.json and compares them with *results_dir*/<suite>.baseline.json if it exists.
+    With *save_baseline* the results are saved as the new baseline instead. Returns True if no benchmark failed.
+    '''
+
+    report = results(suite, benchmarks())
+    saveResults(report, os.path.join(results_dir, '{}.results.json'.format(suite)))
+    baseline_path = os.path.join(results_dir, '{}.baseline.json'.format(suite))
+    if save_baseline:
+        saveResults(report, baseline_path)
+        printResults(report)
+        print('Baseline saved to {}'.format(baseline_path))
+        return True
+    if not os.path.exists(baseline_path):
+        printResults(report)
+        print('No baseline at {}. Save one with the save argument.'.format(baseline_path))
+        return True
+
+    baseline = loadResults(baseline_path)
+    if baseline.get('environment') != report['environment']:
+        print('Baseline was measured on a different setup: {}'.format(baseline.get('environment')))
+    rows = compareResults(report, baseline)
+    printResults(report, rows)
+    failed = [row[0] for row in rows if not row[4]]
+    print('{} of {} benchmarks passed.'.format(len(rows) - len(failed), len(rows)))
+    return not failed
+
+
+def runFromCommandLine(suite, benchmarks):
+    '''Runs *benchmarks* as runSuite() does with 'save' in the command line arguments saving a baseline, and exits with 1 on a failure'''
+
+    if not runSuite(suite, benchmarks, save_baseline='save' in sys.argv[1:]):
+        sys.exit(1)
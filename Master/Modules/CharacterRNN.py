@@ -1,5 +1,5 @@
 '''
-    CharRNN class and one_hot_encode()
+    CharRNN and EmbeddingCharRNN classes, one_hot_encode(), netFromCheckpoint() and quantizeNet()
 '''
 
 import torch
@@ -17,11 +17,14 @@ def one_hot_encode(arr, n_labels):
     return one_hot
 
 class CharRNN(nn.Module):
+
+    input_format = 'one_hot' # Stored in checkpoints so the right class is rebuilt when loading
+    text_format = 'notes' # Text format of the training set, 'notes' or 'events' (see EventTokens), also stored in checkpoints
     
     def __init__(self, tokens, n_hidden, n_layers=3,
-                drop_prob=0.5, lr=0.001):
+                drop_prob=0.5, lr=0.001, input_size=None):
         '''
-        Initiates the CharRNN class
+        Initiates the CharRNN class, whose LSTM takes inputs of *input_size*, one-hot vectors of the characters if None
         
         Attributes:
             chars: Set of characters from training data
@@ -49,7 +52,7 @@ class CharRNN(nn.Module):
         
 
         # Initialise layers
-        self.lstm = nn.LSTM(len(self.chars), n_hidden, n_layers,
+        self.lstm = nn.LSTM(input_size or len(self.chars), n_hidden, n_layers,
                            dropout=drop_prob, batch_first=True)
         self.dropout = nn.Dropout(drop_prob) 
         self.fc = nn.Linear(n_hidden, len(self.chars))
@@ -69,7 +72,7 @@ class CharRNN(nn.Module):
         x = self.dropout(x)
         
         # Stack up LSTM outputs using view
-        x = x.view(x.size()[0]*x.size()[1], self.n_hidden)
+        x = x.contiguous().view(x.size()[0]*x.size()[1], self.n_hidden)
         
         # Put x through the fully connected layer
         x = self.fc(x)
@@ -85,21 +88,23 @@ class CharRNN(nn.Module):
         if h is None:
             h = self.init_hidden(1)
         
-        x = np.array([[self.char2int[char]]])
-        x = one_hot_encode(x, len(self.chars))
-        
-        inputs = torch.from_numpy(x)
+        inputs = self.encodeInput(torch.tensor([[self.char2int[char]]]))
         
         h = tuple([each.data for each in h])
         out, h = self.forward(inputs, h)
         p = F.softmax(out, dim=1).data # Apply softmax to output tensor
         
-        top_ch = np.arrange(len(self.chars))
+        top_ch = np.arange(len(self.chars))
         p = p.numpy().squeeze()
         char = np.random.choice(top_ch, p=p/p.sum()) # Choose prediction (implements a factor of randomness)
         
         return self.int2char[char], h
     
+    def encodeInput(self, x):
+        '''Returns the network input for the LongTensor of character indices *x* as a one-hot float tensor'''
+
+        return F.one_hot(x, len(self.chars)).float()
+
     def init_weights(self):
         '''initialise weights for fully connected layer'''
         initrange = 0.1
@@ -112,7 +117,66 @@ class CharRNN(nn.Module):
     def init_hidden(self, n_seqs):
         '''initialise hidden state'''
         # Create two new tensors with sizes n_layers x n_seqs x n_hidden,
-        # initialised to zero, for hidden state and cell state of LSTM
-        weight = next(self.parameters()).data
-        return (weight.new(self.n_layers, n_seqs, self.n_hidden).zero_(),
-                weight.new(self.n_layers, n_seqs, self.n_hidden).zero_())
+        # initialised to zero, for hidden state and cell state of LSTM.
+        # Not built from the weights, since a quantized net has no float parameters
+        return (torch.zeros(self.n_layers, n_seqs, self.n_hidden),
+                torch.zeros(self.n_layers, n_seqs, self.n_hidden))
+
+
+class EmbeddingCharRNN(CharRNN):
+
+    input_format = 'embedding'
+
+    def __init__(self, tokens, n_hidden, n_layers=3,
+                drop_prob=0.5, lr=0.001, n_embed=64):
+        '''
+        Initiates the EmbeddingCharRNN class, a CharRNN taking character indices instead of one-hot vectors
+
+        Attributes:
+            n_embed: size of the learned vector each character index is mapped to
+            embedding: nn.Embedding object mapping character indices to vectors
+
+        '''
+        super().__init__(tokens, n_hidden, n_layers, drop_prob, lr, input_size=n_embed) # The LSTM is fed by the embedding
+        self.n_embed = n_embed
+        self.embedding = nn.Embedding(len(self.chars), n_embed)
+
+    def forward(self, x, hc):
+        '''
+        Forward pass through the network. x are character indices of shape n_seqs x n_steps, and the hidden/cell state is 'hc'.
+        '''
+
+        return super().forward(self.embedding(x), hc)
+
+    def encodeInput(self, x):
+        '''Returns the network input for the LongTensor of character indices *x*, which is *x* itself'''
+
+        return x
+
+
+def netFromCheckpoint(check):
+    '''
+    Returns the network described by the checkpoint dictionary *check*, with its weights loaded.
+    Quantized checkpoints give an int8 dynamically quantized net or a float net restored from float16 weights.
+    '''
+
+    if check.get('input_format', 'one_hot') == 'embedding':
+        net = EmbeddingCharRNN(check['tokens'], check['n_hidden'], check['n_layers'], n_embed=check['n_embed'])
+    else:
+        net = CharRNN(check['tokens'], check['n_hidden'], check['n_layers'])
+    net.text_format = check.get('text_format', 'notes')
+    state_dict = check['state_dict']
+    if check.get('quantization') == 'dynamic_int8':
+        net.eval()
+        net = quantizeNet(net)
+    elif check.get('quantization') == 'float16':
+        state_dict = {name: value.float() if torch.is_tensor(value) and value.is_floating_point() else value
+                      for name, value in state_dict.items()}
+    net.load_state_dict(state_dict)
+    return net
+
+
+def quantizeNet(net):
+    '''Returns a copy of *net* with its LSTM and fully connected layers dynamically quantized to int8'''
+
+    return torch.ao.quantization.quantize_dynamic(net, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
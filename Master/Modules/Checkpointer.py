@@ -0,0 +1,125 @@
+'''
+    Checkpointer class and RNG state helpers for resumable training
+'''
+
+import os
+import random
+import threading
+import time
+import torch
+import numpy as np
+
+
+def getRngState():
+    '''Returns the state of every random number generator used in training'''
+
+    return {'torch': torch.get_rng_state(), 'numpy': np.random.get_state(), 'python': random.getstate()}
+
+
+def setRngState(state):
+    '''Restores the random number generators from *state*, as returned by getRngState()'''
+
+    torch.set_rng_state(state['torch'])
+    np.random.set_state(state['numpy'])
+    random.setstate(state['python'])
+
+
+def cpuCopy(value):
+    '''Returns a copy of *value* with every tensor cloned to the CPU, so training can keep changing the originals'''
+
+    if torch.is_tensor(value):
+        return value.detach().cpu().clone()
+    if isinstance(value, dict):
+        return {key: cpuCopy(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(cpuCopy(item) for item in value)
+    return value
+
+
+class Checkpointer():
+
+    def __init__(self, path, every_steps=None, every_seconds=None, info=None):
+        '''
+        Initiates the Checkpointer object.
+
+        Attributes:
+            __path: file the checkpoint is written to
+            __every_steps: write a checkpoint every this many training steps
+            __every_seconds: write a checkpoint once this many seconds have passed since the last one
+            __info: extra entries stored in every checkpoint, such as the training set and net name
+            __last_save: time of the previous checkpoint
+            __writer: background thread writing the latest checkpoint
+        '''
+
+        self.__path = path
+        self.__every_steps = every_steps
+        self.__every_seconds = every_seconds
+        self.__info = info if info is not None else {}
+        self.__last_save = time.perf_counter()
+        self.__writer = None
+
+    def get_path(self):
+        '''Returns __path'''
+
+        return self.__path
+
+    def due(self, counter):
+        '''Returns whether a checkpoint should be written after training step *counter*'''
+
+        if self.__every_steps is not None and counter % self.__every_steps == 0:
+            return True
+        if self.__every_seconds is not None and time.perf_counter() - self.__last_save >= self.__every_seconds:
+            return True
+        return False
+
+    def save(self, net_checkpoint, opt, epoch, batch, counter, h, config, wait=False):
+        '''
+        Writes a checkpoint in the background, holding everything needed to carry on training.
+
+        Arguments:
+            net_checkpoint: the net in the format it is saved to 'Nets'
+            opt: optimizer whose state is saved
+            epoch: epoch the next training step belongs to
+            batch: index within that epoch of the next batch
+            counter: number of training steps taken
+            h: hidden state carried into the next batch (of every batch row in packed mode)
+            config: arguments train() was called with. Its 'packed' entry sets the hidden state policy saved:
+                    the state is reset at the start of every solo in packed mode and of every epoch otherwise
+            wait: write before returning instead of in the background
+        '''
+
+        checkpoint = dict(self.__info)
+        checkpoint.update(cpuCopy(net_checkpoint))
+        checkpoint.update({'optimizer': cpuCopy(opt.state_dict()),
+                           'epoch': epoch,
+                           'batch': batch,
+                           'step': counter,
+                           'hidden': cpuCopy(h),
+                           'hidden_policy': 'reset_each_solo' if config.get('packed') else 'reset_each_epoch',
+                           'rng': getRngState(),
+                           'config': dict(config)})
+
+        self.finish() # Only one checkpoint is written at a time
+        self.__last_save = time.perf_counter()
+        self.__writer = threading.Thread(target=self.write, args=(checkpoint,))
+        self.__writer.start()
+        if wait:
+            self.finish()
+
+    def write(self, checkpoint):
+        '''Writes *checkpoint* to a temporary file and moves it over the previous checkpoint'''
+
+        directory = os.path.dirname(self.get_path())
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.get_path() + '.tmp'
+        with open(temp_path, 'wb') as f:
+            torch.save(checkpoint, f)
+        os.replace(temp_path, self.get_path())
+
+    def finish(self):
+        '''Waits for the checkpoint being written, if any'''
+
+        if self.__writer is not None:
+            self.__writer.join()
+            self.__writer = None
@@ -0,0 +1,174 @@
+'''
+    CorpusBuilder class and encodeMidiFile()
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import json
+import os
+
+from Modules.MasterFileHandler import FileHandler
+from Modules.EventTokens import NOTE_FORMAT, EVENT_FORMAT, EVENT_SET_SUFFIX
+
+
+ENCODER_VERSION = 2 # Bump whenever FileHandler.midiToText or midiToEventText output changes so cached solos are re-encoded
+
+
+def encodeMidiFile(path, text_format=NOTE_FORMAT):
+    '''Returns (text, error) for the midi file at *path* in *text_format*. Runs inside a worker process.'''
+
+    try:
+        filer = FileHandler(path, 'x.txt')
+        if text_format == EVENT_FORMAT:
+            return filer.midiToEventText(), None
+        return filer.midiToText(), None
+    except Exception as err:
+        return None, '{}: {}'.format(type(err).__name__, err)
+
+
+def hashFile(path):
+    '''Returns the sha256 hex digest of the contents of *path*'''
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as midi_file:
+        for block in iter(lambda: midi_file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CorpusBuilder():
+
+    def __init__(self, midi_set, midi_dir='Midi_training_data', set_dir='Training_sets', workers=None, text_format=NOTE_FORMAT):
+        '''
+        Initiates the CorpusBuilder object.
+
+        Attributes:
+            __midi_set: name of the directory within *midi_dir* to build the training set from
+            __midi_dir: directory holding every midi set
+            __set_dir: directory the training set and its manifest are saved to
+            __workers: number of worker processes (None uses every core)
+            __text_format: NOTE_FORMAT or EVENT_FORMAT, the text format solos are encoded in
+        '''
+
+        self.__midi_set = midi_set
+        self.__midi_dir = midi_dir
+        self.__set_dir = set_dir
+        self.__workers = workers
+        self.__text_format = text_format
+
+    def get_midiPath(self):
+        '''Returns the directory holding the midi files of the set'''
+
+        return os.path.join(self.__midi_dir, self.__midi_set)
+
+    def get_setName(self):
+        '''Returns the name of the training set, which is marked with EVENT_SET_SUFFIX in the event format'''
+
+        if self.__text_format == EVENT_FORMAT:
+            return self.__midi_set + EVENT_SET_SUFFIX
+        return self.__midi_set
+
+    def get_setPath(self):
+        '''Returns the path of the training set text file'''
+
+        return os.path.join(self.__set_dir, '{}.txt'.format(self.get_setName()))
+
+    def get_manifestPath(self):
+        '''Returns the path of the manifest kept next to the training set'''
+
+        return os.path.join(self.__set_dir, '{}.manifest.json'.format(self.get_setName()))
+
+    def get_workers(self):
+        '''Returns __workers'''
+
+        return self.__workers
+
+    def get_textFormat(self):
+        '''Returns __text_format'''
+
+        return self.__text_format
+
+    def loadManifest(self):
+        '''
+        Returns the previous manifest, or an empty one if it is missing, stale or unreadable, or if it does not describe
+        the training set on disk, as when a build stopped between replacing the set and saving its manifest
+        '''
+
+        empty = {'encoder': ENCODER_VERSION, 'files': {}, 'failed': {}}
+        if not (os.path.exists(self.get_manifestPath()) and os.path.exists(self.get_setPath())):
+            return empty
+        try:
+            with open(self.get_manifestPath(), 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return empty
+        if manifest.get('encoder') != ENCODER_VERSION:
+            return empty
+        set_info = manifest.get('set', {})
+        if set_info.get('size') != os.path.getsize(self.get_setPath()) or set_info.get('sha256') != hashFile(self.get_setPath()):
+            return empty # The offsets would point into a different set
+        return manifest
+
+    def saveManifest(self, manifest):
+        '''Atomically writes *manifest* next to the training set'''
+
+        temp_path = self.get_manifestPath() + '.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.get_manifestPath())
+
+    def build(self):
+        '''
+        Creates or updates the training set of the midi set and returns the new manifest.
+        Only midi files that were added or changed since the last build are re-encoded.
+        '''
+
+        midi_path = self.get_midiPath()
+        filenames = sorted(name for name in os.listdir(midi_path) if name.endswith('.mid'))
+        hashes = {name: hashFile(os.path.join(midi_path, name)) for name in filenames}
+
+        old_manifest = self.loadManifest()
+        old_files = old_manifest['files']
+        to_encode = [name for name in filenames
+                     if name not in old_files or old_files[name]['sha256'] != hashes[name]]
+
+        os.makedirs(self.__set_dir, exist_ok=True)
+        manifest = {'encoder': ENCODER_VERSION, 'files': {}, 'failed': {}}
+        temp_path = self.get_setPath() + '.tmp'
+        old_set = open(self.get_setPath(), 'rb') if old_files else None
+        set_digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as set_file, ProcessPoolExecutor(self.get_workers()) as pool:
+                # Results come back in the order of *to_encode*, so solos are streamed straight into the set
+                encoded = pool.map(encodeMidiFile, [os.path.join(midi_path, name) for name in to_encode],
+                                   itertools.repeat(self.get_textFormat()), chunksize=4)
+                for name in filenames:
+                    if name in old_files and old_files[name]['sha256'] == hashes[name]:
+                        # Reuse the solo from the previous training set
+                        old_set.seek(old_files[name]['offset'])
+                        segment = old_set.read(old_files[name]['length'])
+                    else:
+                        text, error = next(encoded)
+                        if error is not None:
+                            manifest['failed'][name] = error
+                            continue
+                        segment = ('### ' + text).encode('utf-8') # Note information for every solo seperated by '###'
+                    manifest['files'][name] = {'sha256': hashes[name], 'offset': set_file.tell(), 'length': len(segment)}
+                    set_file.write(segment)
+                    set_digest.update(segment)
+                set_file.write(b'###')
+                set_digest.update(b'###')
+                manifest['set'] = {'size': set_file.tell(), 'sha256': set_digest.hexdigest()}
+        finally:
+            if old_set is not None:
+                old_set.close()
+        os.replace(temp_path, self.get_setPath())
+        self.saveManifest(manifest)
+
+        print('')
+        print('{} solos encoded, {} reused, {} failed.'.format(
+            len(to_encode) - len(manifest['failed']), len(filenames) - len(to_encode), len(manifest['failed'])))
+        for name, error in sorted(manifest['failed'].items()):
+            print('- {}: {}'.format(name, error))
+        return manifest
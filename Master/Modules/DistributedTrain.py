@@ -0,0 +1,128 @@
+'''
+    Data-parallel training across processes and machines with torch.distributed
+'''
+
+import copy
+import os
+import time
+import torch
+import torch.nn as nn
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+from Modules.CharacterRNN import CharRNN, EmbeddingCharRNN
+from Modules.EncodedCorpus import loadCorpus
+from Modules.TrainNN import batchStream, trainStep, saveNet, trainedEpochs
+from Modules.Validator import validationLoss
+from Modules.BatchPipeline import batchViews
+from Modules.EventTokens import textFormat
+
+
+def shardData(data, rank, world_size):
+    '''Returns the equal-length slice of *data* trained on by worker *rank*, so every worker takes the same number of steps'''
+
+    shard_len = len(data) // world_size
+    return data[rank * shard_len:(rank + 1) * shard_len]
+
+
+def calibrate(net, data, n_seqs, n_steps, clip, steps=5):
+    '''Returns the characters per second one worker trains on alone, without synchronising gradients'''
+
+    local = copy.deepcopy(net)
+    opt = torch.optim.Adam(local.parameters())
+    criterion = nn.CrossEntropyLoss()
+    h = local.init_hidden(n_seqs)
+    batches = batchStream(local, data, n_seqs, n_steps)
+    trainStep(local, opt, criterion, *next(batches), h, clip) # Warm up
+    start = time.perf_counter()
+    taken = 0
+    for inputs, targets in batches:
+        loss, h = trainStep(local, opt, criterion, inputs, targets, h, clip)
+        taken += 1
+        if taken == steps:
+            break
+    return taken * n_seqs * n_steps / (time.perf_counter() - start)
+
+
+def trainWorker(local_rank, config):
+    '''
+    Trains one data-parallel worker. Run by every process through launchDistributed().
+
+    Arguments:
+        local_rank: index of the worker on this machine
+        config: dictionary of the arguments given to launchDistributed()
+    '''
+
+    rank = config['node_rank'] * config['procs_per_node'] + local_rank
+    world_size = config['procs_per_node'] * config['n_nodes']
+    torch.set_num_threads(config['threads_per_worker'])
+    dist.init_process_group('gloo', init_method='tcp://{}:{}'.format(config['master_addr'], config['master_port']),
+                            rank=rank, world_size=world_size)
+
+    chars, encoded = loadCorpus(config['dataset']) # Memory-mapped, so every worker on a machine shares the pages
+    val_idx = int(len(encoded) * (1 - config['val_frac']))
+    data, val_data = shardData(encoded[:val_idx], rank, world_size), encoded[val_idx:]
+
+    torch.manual_seed(0)
+    if config['use_embedding']:
+        net = EmbeddingCharRNN(chars, n_hidden=config['n_hidden'], n_layers=config['n_layers'])
+    else:
+        net = CharRNN(chars, n_hidden=config['n_hidden'], n_layers=config['n_layers'])
+    net.text_format = textFormat(config['dataset'])
+    n_seqs = max(1, config['n_seqs'] // world_size) # Sequences per worker, so the global batch stays *n_seqs*
+    n_steps, clip = config['n_steps'], config['clip']
+
+    single_rate = None
+    if rank == 0 and world_size > 1:
+        single_rate = calibrate(net, data, n_seqs, n_steps, clip)
+    dist.barrier()
+
+    model = DistributedDataParallel(net) # Broadcasts rank 0's weights and all-reduces gradients in backward()
+    opt = torch.optim.Adam(model.parameters(), lr=config['lr'])
+    criterion = nn.CrossEntropyLoss()
+    xs, ys = batchViews(val_data, n_seqs, n_steps)
+
+    counter = 0
+    start = time.perf_counter()
+    for e in range(trainedEpochs(config['epochs'], config['print_every'])): # As many as train() runs
+        h = net.init_hidden(n_seqs)
+        for inputs, targets in batchStream(net, data, n_seqs, n_steps, config['prefetch']):
+            loss, h = trainStep(model, opt, criterion, inputs, targets, h, clip)
+            counter += 1
+            if rank == 0 and counter % config['print_every'] == 0:
+                print('Epoch: {}/{}...'.format(e+1, config['epochs']))
+                print('Step: {}...'.format(counter))
+                print('Loss: {:.4f}...'.format(loss.item()))
+                print('Val Loss: {:.4f}'.format(validationLoss(net, xs, ys, range(min(len(xs), config['val_batches'])))))
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        rate = counter * n_seqs * n_steps * world_size / elapsed
+        print('Trained on {:.0f} characters/sec with {} workers.'.format(rate, world_size))
+        if single_rate is not None:
+            print('Single worker: {:.0f} characters/sec. Scaling efficiency: {:.0%}'.format(single_rate, rate / (single_rate * world_size)))
+        saveNet(net, config['model_name'])
+    dist.destroy_process_group()
+
+
+def launchDistributed(dataset, epochs, procs_per_node=None, n_nodes=1, node_rank=0, master_addr='127.0.0.1', master_port=29500,
+                      use_embedding=False, n_hidden=512, n_layers=3, n_seqs=128, n_steps=60, lr=0.001, clip=5,
+                      val_frac=0.1, print_every=10, val_batches=8, prefetch=2):
+    '''
+    Starts *procs_per_node* data-parallel training workers on this machine, one of *n_nodes* machines taking part.
+    Machine 0 hosts the rendezvous at *master_addr*:*master_port* and saves the trained net to 'Nets'.
+    '''
+
+    if procs_per_node is None:
+        procs_per_node = max(1, (os.cpu_count() or 1) // 4)
+    config = {'dataset': dataset, 'epochs': epochs, 'procs_per_node': procs_per_node, 'n_nodes': n_nodes,
+              'node_rank': node_rank, 'master_addr': master_addr, 'master_port': master_port,
+              'use_embedding': use_embedding, 'n_hidden': n_hidden, 'n_layers': n_layers, 'n_seqs': n_seqs,
+              'n_steps': n_steps, 'lr': lr, 'clip': clip, 'val_frac': val_frac, 'print_every': print_every,
+              'val_batches': val_batches, 'prefetch': prefetch,
+              'threads_per_worker': max(1, (os.cpu_count() or 1) // procs_per_node),
+              'model_name': 'ALIS_{}_{}.net'.format(dataset[:-4], epochs)}
+
+    loadCorpus(dataset) # Compile the training set once before the workers start
+    mp.spawn(trainWorker, args=(config,), nprocs=procs_per_node, join=True)
@@ -0,0 +1,85 @@
+'''
+    Compiling training sets into memory-mapped token files
+'''
+
+import json
+import os
+import numpy as np
+
+
+CHUNK_CHARS = 1 << 22 # Characters read from the training set at a time while compiling
+
+
+def compiledPaths(dataset, compiled_dir='Compiled_sets'):
+    '''Returns the paths of the token file and vocab sidecar for the training set file *dataset*'''
+
+    name = os.path.splitext(dataset)[0]
+    return os.path.join(compiled_dir, '{}.tokens'.format(name)), os.path.join(compiled_dir, '{}.vocab.json'.format(name))
+
+
+def readChunks(path):
+    '''Yields the text of *path* a chunk at a time. Training sets are UTF-8 whatever the locale, as the event format goes past ASCII'''
+
+    with open(path, 'r', encoding='utf-8') as text_file:
+        for chunk in iter(lambda: text_file.read(CHUNK_CHARS), ''):
+            yield chunk
+
+
+def compileCorpus(dataset, set_dir='Training_sets', compiled_dir='Compiled_sets'):
+    '''
+    Encodes the training set *dataset* once into a token file holding one integer per character
+    and a vocab sidecar listing the characters in token order.
+    '''
+
+    text_path = os.path.join(set_dir, dataset)
+    tokens_path, vocab_path = compiledPaths(dataset, compiled_dir)
+
+    # First pass finds the characters used
+    chars = set()
+    for chunk in readChunks(text_path):
+        chars.update(chunk)
+    chars = sorted(chars)
+    dtype = np.uint8 if len(chars) <= 256 else np.uint16
+
+    lookup = np.zeros(ord(chars[-1]) + 1, dtype=dtype) if chars else np.zeros(1, dtype=dtype)
+    for ii, ch in enumerate(chars):
+        lookup[ord(ch)] = ii
+
+    # Second pass writes the tokens
+    os.makedirs(compiled_dir, exist_ok=True)
+    with open(tokens_path + '.tmp', 'wb') as tokens_file:
+        for chunk in readChunks(text_path):
+            codes = np.frombuffer(chunk.encode('utf-32-le'), dtype=np.uint32)
+            tokens_file.write(lookup[codes].tobytes())
+    os.replace(tokens_path + '.tmp', tokens_path)
+
+    stat = os.stat(text_path)
+    vocab = {'chars': chars, 'dtype': np.dtype(dtype).name, 'source_size': stat.st_size, 'source_mtime': stat.st_mtime}
+    with open(vocab_path, 'w', encoding='utf-8') as vocab_file:
+        json.dump(vocab, vocab_file)
+    print('{} compiled to {}'.format(dataset, tokens_path))
+
+
+def loadCorpus(dataset, set_dir='Training_sets', compiled_dir='Compiled_sets'):
+    '''
+    Returns (chars, tokens) for the training set *dataset*, where tokens is a read-only memmap of the compiled set.
+    The set is compiled first if it never was or has changed since.
+    '''
+
+    text_path = os.path.join(set_dir, dataset)
+    tokens_path, vocab_path = compiledPaths(dataset, compiled_dir)
+    stat = os.stat(text_path)
+
+    vocab = None
+    if os.path.exists(tokens_path) and os.path.exists(vocab_path):
+        with open(vocab_path, 'r', encoding='utf-8') as vocab_file:
+            vocab = json.load(vocab_file)
+        if vocab['source_size'] != stat.st_size or vocab['source_mtime'] != stat.st_mtime:
+            vocab = None
+    if vocab is None:
+        compileCorpus(dataset, set_dir, compiled_dir)
+        with open(vocab_path, 'r', encoding='utf-8') as vocab_file:
+            vocab = json.load(vocab_file)
+
+    tokens = np.memmap(tokens_path, dtype=vocab['dtype'], mode='r')
+    return tuple(vocab['chars']), tokens
@@ -0,0 +1,123 @@
+'''
+    The event text format: every note as three characters, its onset delta bucket, pitch and duration bucket.
+    Kept identical in the Master and User so text encoded for training decodes the same after sampling.
+'''
+
+import os
+import numpy as np
+
+
+# Text formats a net may be trained on, stored in its checkpoint as 'text_format'
+NOTE_FORMAT = 'notes' # 'start!pitch!end ' with base-36 ticks
+EVENT_FORMAT = 'events' # Onset delta, pitch and duration characters
+
+EVENT_SET_SUFFIX = '.events' # Training sets in the event format are saved as <midi set>.events.txt
+
+# Tick values the onset deltas and durations are rounded to. Holds the straight, dotted and triplet lengths
+# of 160 ticks a beat and the 192 ticks a beat some of the training files use
+TICK_BUCKETS = (0, 1, 5, 10, 15, 20, 24, 30, 32, 40, 48, 60, 64, 80, 96, 120, 128, 160, 180, 192, 240, 256,
+                320, 384, 480, 560, 640, 720, 960, 1280, 1440, 1920, 2560, 2880, 3840, 5120, 7680)
+DELTA_BASE = 0x100 # Character of the first onset delta bucket, past every pitch character chr(pitch + 26)
+DURATION_BASE = 0x180 # Character of the first duration bucket
+
+BASE_36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+LOG_BUCKETS = np.log(np.maximum(TICK_BUCKETS, 0.5)) # 0 counts as half a tick, so 1 tick rounds to 1 and not 0
+
+
+def textFormat(dataset):
+    '''Returns the text format of the training set file *dataset*'''
+
+    return EVENT_FORMAT if os.path.splitext(dataset)[0].endswith(EVENT_SET_SUFFIX) else NOTE_FORMAT
+
+
+def bucket(ticks):
+    '''Returns the index of the bucket of TICK_BUCKETS nearest to *ticks* on a log scale'''
+
+    return int(np.abs(LOG_BUCKETS - np.log(max(ticks, 0.5))).argmin())
+
+
+def isDelta(ch):
+    '''Returns True if *ch* is an onset delta character'''
+
+    return DELTA_BASE <= ord(ch) < DELTA_BASE + len(TICK_BUCKETS)
+
+
+def isPitch(ch):
+    '''Returns True if *ch* is a pitch character chr(pitch + 26), leaving out the separators of the note text format'''
+
+    return ch not in ' !#' and 0 <= ord(ch) - 26 <= 127
+
+
+def isDuration(ch):
+    '''Returns True if *ch* is a duration character'''
+
+    return DURATION_BASE <= ord(ch) < DURATION_BASE + len(TICK_BUCKETS)
+
+
+def notesToEvents(notes):
+    '''
+    Returns the event text of *notes*, a list of [start tick, pitch, end tick] in onset order.
+    Each delta is taken from the onset the previous note decodes to, so rounding never accumulates along the solo.
+    '''
+
+    text = []
+    onset = 0 # Onset of the previous note once decoded
+    for start, pitch, end in notes:
+        delta = bucket(max(start - onset, 0))
+        onset += TICK_BUCKETS[delta]
+        text.append(chr(DELTA_BASE + delta) + chr(int(pitch) + 26) + chr(DURATION_BASE + bucket(end - start)))
+    return ''.join(text)
+
+
+def eventToNote(event, onset):
+    '''Returns [start tick, pitch, end tick] of the delta, pitch and duration characters *event* following a note at *onset*'''
+
+    start = onset + TICK_BUCKETS[ord(event[0]) - DELTA_BASE]
+    return [start, ord(event[1]) - 26, start + TICK_BUCKETS[ord(event[2]) - DURATION_BASE]]
+
+
+def eventsToNotes(events):
+    '''
+    Generator yielding [start tick, pitch, end tick] for every complete delta, pitch and duration triple in the event
+    text *events*. Characters out of place are skipped, and the '###' between solos restarts the onset at 0.
+    '''
+
+    onset, note = 0, []
+    for ch in events:
+        if isDelta(ch):
+            note = [ch]
+        elif len(note) == 1 and isPitch(ch):
+            note.append(ch)
+        elif len(note) == 2 and isDuration(ch):
+            decoded = eventToNote(note + [ch], onset)
+            onset = decoded[0]
+            yield decoded
+            note = []
+        else:
+            note = []
+            if ch == '#':
+                onset = 0
+
+
+def toBase36(ticks):
+    '''Returns *ticks* as a base-36 string, as in the note text format'''
+
+    digits = ''
+    while True:
+        ticks, digit = divmod(ticks, 36)
+        digits = BASE_36[digit] + digits
+        if ticks == 0:
+            return digits
+
+
+def noteText(start, pitch, end):
+    '''Returns the note 'start!pitch!end' in the note text format'''
+
+    return '{}!{}!{}'.format(toBase36(start), chr(pitch + 26), toBase36(end))
+
+
+def toNoteText(events):
+    '''Returns the first solo of the sampled event text *events*, which starts with '### ', in the note text format'''
+
+    tagless = events[4:].split('###')[0] # As Filer.cutTags() for the note text format
+    return '### ' + ''.join(noteText(*note) + ' ' for note in eventsToNotes(tagless)) + '###'
@@ -0,0 +1,130 @@
+'''
+    Export of a net's sampling step as a TorchScript module, or of its weights as NumPy arrays, for the User generator
+
+    Run from the Master directory with:
+        python -m Modules.ExportNet <net name> [script|numpy]
+'''
+
+import json
+import os
+import sys
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from Modules.CharacterRNN import netFromCheckpoint
+from Modules.QuantizeNet import loadCheckpoint
+
+
+class OneHot(nn.Module):
+
+    def __init__(self, n_chars):
+        '''
+        Initiates the OneHot class, turning character indices into the one-hot input of a CharRNN
+
+        Attributes:
+            n_chars: number of characters in the vocabulary
+        '''
+        super().__init__()
+        self.n_chars = n_chars
+
+    def forward(self, x):
+        '''Returns the character indices *x* as one-hot float vectors'''
+
+        return F.one_hot(x, self.n_chars).float()
+
+
+class SamplingStep(nn.Module):
+
+    def __init__(self, net):
+        '''
+        Initiates the SamplingStep class, the inference-only part of *net* used while sampling
+
+        Attributes:
+            encoder: turns character indices into LSTM input (one-hot or the net's embedding)
+            lstm: the net's LSTM
+            fc: the net's fully connected layer
+        '''
+        super().__init__()
+        self.encoder = net.embedding if net.input_format == 'embedding' else OneHot(len(net.chars))
+        self.lstm = net.lstm
+        self.fc = net.fc
+
+    def forward(self, x: torch.Tensor, h: torch.Tensor, c: torch.Tensor):
+        '''
+        Runs the character indices *x* (n_seqs x n_steps) through the net from the hidden/cell state *h*, *c*.
+        Returns the next-character probabilities after the last step (n_seqs x n_chars) and the new *h*, *c*.
+        '''
+
+        out, (h, c) = self.lstm(self.encoder(x), (h, c))
+        return F.softmax(self.fc(out[:, -1]), dim=1), h, c
+
+
+def exportedName(net_name, extension):
+    '''Returns the file name the export of *net_name* with file extension *extension* is saved as, e.g. ALIS_All_20.script.pt'''
+
+    base = os.path.splitext(net_name)[0]
+    for suffix in ('.int8', '.fp16'): # A quantized net is exported under the name of its original
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return base + extension
+
+
+def exportSamplingStep(net_name, net_dir='Nets'):
+    '''
+    Scripts the sampling step of the net *net_name* (which may be a quantized version) and saves it
+    with its vocabulary next to the net in *net_dir*. Returns the new file name.
+    '''
+
+    check = loadCheckpoint(os.path.join(net_dir, net_name))
+    net = netFromCheckpoint(check)
+    net.eval()
+    step = torch.jit.script(SamplingStep(net))
+    vocab = {'tokens': list(net.chars), 'n_layers': net.n_layers, 'n_hidden': net.n_hidden,
+             'text_format': net.text_format, 'source': net_name, 'quantization': check.get('quantization')}
+
+    # Check the scripted step against the net it came from
+    prime = torch.tensor([[net.char2int[ch] for ch in '### ']])
+    h = net.init_hidden(1)
+    with torch.no_grad():
+        out, _ = net.forward(net.encodeInput(prime), h)
+        expected = F.softmax(out[-1:], dim=1)
+        probs, _, _ = step(prime, *h)
+    difference = (probs - expected).abs().max().item()
+
+    scripted_name = exportedName(net_name, '.script.pt')
+    torch.jit.save(step, os.path.join(net_dir, scripted_name), _extra_files={'vocab.json': json.dumps(vocab)})
+    print('{} saved in the \'{}\' directory. (largest difference from the net: {:.2e})'.format(scripted_name, net_dir, difference))
+    return scripted_name
+
+
+def exportNumpy(net_name, net_dir='Nets'):
+    '''
+    Saves the weights and vocabulary of the float or float16 net *net_name* as a .npz file next to it in *net_dir*,
+    for the User's NumPy backend, which runs without PyTorch. Returns the new file name.
+    '''
+
+    check = loadCheckpoint(os.path.join(net_dir, net_name))
+    if check.get('quantization') == 'dynamic_int8':
+        raise ValueError('int8 nets hold packed weights. Export the net they were made from instead.')
+    net = netFromCheckpoint(check)
+    arrays = {name: value.float().numpy() for name, value in net.state_dict().items()}
+    arrays['vocab'] = np.array(json.dumps({'tokens': list(net.chars), 'n_layers': net.n_layers, 'n_hidden': net.n_hidden,
+                                           'input_format': net.input_format, 'text_format': net.text_format,
+                                           'source': net_name}))
+
+    numpy_name = exportedName(net_name, '.npz')
+    with open(os.path.join(net_dir, numpy_name), 'wb') as f:
+        np.savez(f, **arrays)
+    print('{} saved in the \'{}\' directory.'.format(numpy_name, net_dir))
+    return numpy_name
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    if len(sys.argv) > 2 and sys.argv[2] == 'numpy':
+        exportNumpy(sys.argv[1])
+    else:
+        exportSamplingStep(sys.argv[1])
@@ -0,0 +1,83 @@
+'''
+    Benchmarks of encoding the bundled midi files to text and of training steps, run offline on synthetic nets
+
+    Run from the Master directory with:
+        python -m Modules.MasterBenchmark [save]
+    Results are saved to Benchmarks/master.results.json and compared with Benchmarks/master.baseline.json,
+    exiting with 1 if a benchmark is worse than its baseline by more than its tolerance. With save they become the baseline.
+'''
+
+import os
+import statistics
+import numpy as np
+import torch
+import torch.nn as nn
+
+from Modules.BenchmarkReport import benchmark, timeRepeats, runFromCommandLine
+from Modules.CharacterRNN import CharRNN
+from Modules.MasterFileHandler import FileHandler
+from Modules.TrainNN import prepareBatch, trainStep
+
+
+BENCHMARK_MIDI_DIR = os.path.join('Midi_training_data', 'Rock')
+TRAIN_BATCH_SIZES = (16, 64, 128) # n_seqs of the train step benchmarks, up to the 128 trainNSaveRNN uses
+TRAIN_STEPS = 60 # n_steps, as trainNSaveRNN uses
+SYNTHETIC_CHARS = 96 # About the vocabulary size of the All training set
+
+
+def encodeBenchmarks(midi_dir=BENCHMARK_MIDI_DIR, repeats=5):
+    '''
+    Returns the benchmarks of encoding every midi file in *midi_dir* to the note and the event text format.
+    Each file takes its fastest encode, as a file takes only milliseconds and the slower repeats are mostly noise.
+    '''
+
+    files = sorted(name for name in os.listdir(midi_dir) if name.lower().endswith('.mid'))
+    benchmarks = {}
+    for text_format, encode in (('notes', FileHandler.midiToText), ('events', FileHandler.midiToEventText)):
+        seconds = {}
+        for name in files:
+            filer = FileHandler(os.path.join(midi_dir, name), 'x.txt')
+            seconds[name] = min(timeRepeats(lambda: encode(filer), repeats))
+        benchmarks['encode.{}'.format(text_format)] = benchmark(sum(seconds.values()) / len(files), 's/file', tolerance=0.5,
+                                                                repeats=repeats, detail=seconds)
+    return benchmarks
+
+
+def trainStepBenchmarks(batch_sizes=TRAIN_BATCH_SIZES, n_steps=TRAIN_STEPS, repeats=5):
+    '''
+    Returns the benchmarks of one training step, batch encoding included, of a synthetic net the size trainNSaveRNN trains
+    on random tokens, for every batch size in *batch_sizes*
+    '''
+
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    net = CharRNN([chr(ii + 32) for ii in range(SYNTHETIC_CHARS)], n_hidden=512, n_layers=3)
+    net.train()
+    opt = torch.optim.Adam(net.parameters(), lr=0.001)
+    criterion = nn.CrossEntropyLoss()
+
+    benchmarks = {}
+    for n_seqs in batch_sizes:
+        tokens = rng.integers(0, SYNTHETIC_CHARS, (n_seqs, n_steps + 1), dtype=np.uint8)
+        h = net.init_hidden(n_seqs)
+        def step():
+            inputs, targets = prepareBatch(net, tokens[:, :-1], tokens[:, 1:])
+            trainStep(net, opt, criterion, inputs, targets, h, clip=5)
+        seconds = statistics.median(timeRepeats(step, repeats, warmup=2))
+        benchmarks['train_step.{}x{}'.format(n_seqs, n_steps)] = benchmark(seconds, 's/step', repeats=repeats,
+                                                                           detail={'tokens_per_sec': n_seqs * n_steps / seconds})
+    return benchmarks
+
+
+def masterBenchmarks():
+    '''Returns every Master benchmark'''
+
+    benchmarks = encodeBenchmarks()
+    benchmarks.update(trainStepBenchmarks())
+    return benchmarks
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    runFromCommandLine('master', masterBenchmarks)
@@ -4,6 +4,10 @@
 
 import py_midicsv
 import os
+from collections import deque
+
+from Modules.MidiReader import readNoteEvents
+from Modules.EventTokens import notesToEvents
 
 
 class FileHandler():
@@ -33,8 +37,7 @@ class FileHandler():
     def midiToText(self):
         '''Returns relevant contents of midi file as coded text'''
 
-        csv_list = self.midiToCSV()
-        cleaned_list = self.convertMessages(self.cleanTracks(csv_list))
+        cleaned_list = self.midiToEvents()
         compressed_list = self.compressText(cleaned_list)
         text_list = self.joinNotes(compressed_list)
         return text_list
@@ -48,35 +51,43 @@ class FileHandler():
             stringer = stringer + text_note
         return stringer
 
+    def midiToEventText(self):
+        '''Returns the notes of the midi file as text in the event format, three characters a note (see EventTokens)'''
+
+        return notesToEvents(self.pairNotes(self.midiToEvents()))
+
+    def pairNotes(self, solo):
+        '''
+        Returns [start tick, pitch, end tick] for each note, in onset order.
+        Pairs every note-on with its note-off in a single pass using a queue of open notes per pitch.
+        Overlapping notes on the same pitch are paired first in, first out: a note-off ends the earliest
+        note of its pitch still sounding, as most synthesizers play it.
+        Stray note-offs and notes that are never terminated are dropped.
+        '''
+
+        notes = []
+        open_notes = {} # Maps pitch to a queue of indices into notes of notes still sounding
+        for tick, note, is_on in solo:
+            if is_on:
+                open_notes.setdefault(note, deque()).append(len(notes))
+                notes.append([int(tick), int(note), None])
+            elif open_notes.get(note):
+                notes[open_notes[note].popleft()][2] = int(tick)
+        return [note for note in notes if note[2] is not None]
+
     def compressText(self, solo):
-        '''Returns 2d-list of compressed representations of values for each note'''
+        '''Returns 2d-list of compressed representations of values for each note, in onset order'''
 
-        item = 0
-        cutting = True
         comp_solo = []
-        while cutting:
-            if len(solo) != 0:
-                note = solo[0][1]
-                start = self.toHexatridecimal(solo[0][0])[1:]
-                if start == '':
-                    start = '0'
-                looking = True
-                item1 = 1
-                while looking:
-                    if solo[item1][1] == note:
-                        end = self.toHexatridecimal(solo[item1][0])[1:]
-                        if end == '':
-                            end = '0'
-                        del solo[item1]
-                        looking = False
-                    else:
-                        item1 += 1
-                asc_note = chr(int(note) + 26) # Shifts ascii value to ensure ascii character is printable
-                comp_solo.append([start, asc_note, end])
-                del solo[0]
-            else:
-                cutting = False   
-        return comp_solo  
+        for start, note, end in self.pairNotes(solo):
+            start = self.toHexatridecimal(start)[1:]
+            if start == '':
+                start = '0'
+            end = self.toHexatridecimal(end)[1:]
+            if end == '':
+                end = '0'
+            comp_solo.append([start, chr(note + 26), end]) # Shifts ascii value to ensure ascii character is printable
+        return comp_solo
 
     def toHexatridecimal(self, decimalstring):
         '''Returns argument as a hexatridecimal string'''
@@ -90,25 +101,20 @@ class FileHandler():
         return self.toHexatridecimal(rest) + digits[x]
 
     def convertMessages(self, csv_list):
-        '''Returns 2d-list of relevant event information for each event as integers'''
+        '''
+        Returns 2d-list of [tick, pitch, is_on] for each note event.
+        A note-on with velocity 0 counts as a note-off.
+        '''
 
         required_messages = ['Note_on_c', 'Note_off_c']
-        csv_list = [message.split(', ') for message in csv_list]
-        del_list = []
-        for i in range(len(csv_list)):
-            if csv_list[i][2] not in required_messages:
-                del_list.append(i)
-        deleted_items = 0
-        for index in del_list:
-            del csv_list[index - deleted_items]
-            deleted_items += 1
+        events = []
         for message in csv_list:
-            # Gets rid of '\n' in final item
-            del message[0]
-            del message[1]
-            del message[1]
-            del message[-1]
-        return csv_list
+            fields = message.split(', ')
+            if fields[2] not in required_messages:
+                continue
+            is_on = fields[2] == 'Note_on_c' and int(fields[5]) != 0 # Final field still holds '\n'
+            events.append([fields[1], fields[4], is_on])
+        return events
 
     def cleanTracks(self, csv_list):   
         '''Returns list of MIDI messages in track with solo'''
@@ -124,6 +130,11 @@ class FileHandler():
             deleted_items +=1
         return csv_list
 
+    def midiToEvents(self):
+        '''Returns [tick, pitch, is_on] for each note event in the track with the solo, read straight from the MIDI file'''
+
+        return readNoteEvents(self.get_fromFile(), track=2).tolist()
+
     def midiToCSV(self):
         '''Returns content of MIDI file as CSV list'''
 
@@ -132,7 +143,7 @@ class FileHandler():
 
 
     def writeTextToFile(self, text):
-        with open(self.get_toFile(), 'w') as training_file:
+        with open(self.get_toFile(), 'w', encoding='utf-8') as training_file:
             training_file.write(text)
 
     def removeFile(self):
@@ -0,0 +1,108 @@
+'''
+    Streaming standard MIDI file reader returning note events as integer arrays
+'''
+
+import struct
+import numpy as np
+
+
+NOTE_EVENT = np.dtype([('tick', np.int64), ('pitch', np.uint8), ('on', np.bool_)])
+
+# Number of data bytes following each channel message status nibble
+DATA_LENGTHS = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+
+def readChunkHeader(midi_file):
+    '''Returns (chunk type, chunk length) of the next chunk in *midi_file*, or (None, 0) at the end of the file'''
+
+    header = midi_file.read(8)
+    if len(header) < 8:
+        return None, 0
+    chunk_type, length = struct.unpack('>4sL', header)
+    return chunk_type, length
+
+
+def readNoteEvents(path, track=2):
+    '''
+    Returns a NOTE_EVENT array of (tick, pitch, on) for every note message in *track* of the midi file at *path*.
+    Tracks are numbered from 1 in file order, as in py_midicsv. Every other track is skipped by its chunk
+    length without being decoded. A note-on with velocity 0 counts as a note-off.
+    '''
+
+    with open(path, 'rb') as midi_file:
+        chunk_type, length = readChunkHeader(midi_file)
+        if chunk_type != b'MThd':
+            raise ValueError('Bad header in MIDI file {}'.format(path))
+        midi_file.seek(length, 1)
+
+        track_number = 0
+        while True:
+            chunk_type, length = readChunkHeader(midi_file)
+            if chunk_type is None:
+                raise ValueError('Track {} not found in MIDI file {}'.format(track, path))
+            if chunk_type == b'MTrk':
+                track_number += 1
+                if track_number == track:
+                    data = midi_file.read(length)
+                    break
+            midi_file.seek(length, 1) # Skip the chunk without decoding it
+
+    return decodeNoteEvents(data)
+
+
+def decodeNoteEvents(data):
+    '''Returns a NOTE_EVENT array of the note messages in the track chunk body *data*'''
+
+    ticks = []
+    pitches = []
+    ons = []
+    tick = 0
+    status = 0
+    i = 0
+    end = len(data)
+    while i < end:
+        # Variable-length delta time
+        delta = 0
+        while True:
+            byte = data[i]
+            i += 1
+            delta = (delta << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                break
+        tick += delta
+
+        byte = data[i]
+        if byte >= 0x80:
+            i += 1
+            if byte < 0xF0:
+                status = byte # Only channel messages set the running status
+        else:
+            byte = status # Running status, *byte* is already the first data byte
+
+        if byte == 0xFF or byte == 0xF0 or byte == 0xF7:
+            if byte == 0xFF:
+                i += 1 # Meta type
+            length = 0
+            while True:
+                value = data[i]
+                i += 1
+                length = (length << 7) | (value & 0x7F)
+                if value < 0x80:
+                    break
+            i += length
+            continue
+
+        kind = byte >> 4
+        if kind == 0x9 or kind == 0x8:
+            ticks.append(tick)
+            pitches.append(data[i])
+            ons.append(kind == 0x9 and data[i + 1] != 0)
+        elif kind not in DATA_LENGTHS:
+            raise ValueError('Invalid MIDI status byte {:#x}'.format(byte))
+        i += DATA_LENGTHS[kind]
+
+    events = np.empty(len(ticks), dtype=NOTE_EVENT)
+    events['tick'] = ticks
+    events['pitch'] = pitches
+    events['on'] = ons
+    return events
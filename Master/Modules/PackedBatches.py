@@ -0,0 +1,221 @@
+'''
+    Whole-solo training batches: solos bucketed by length, packed one after the other into the batch rows
+    and trained with truncated BPTT, with the hidden state of a row reset at the start of every solo
+
+    Run from the Master directory to compare them with the contiguous batches of get_batches:
+        python -m Modules.PackedBatches <training set> [n_seqs] [n_steps]
+'''
+
+import copy
+import sys
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+
+from Modules.BatchPipeline import batchViews, prefetchItems
+
+
+def soloSpans(data, chars):
+    '''
+    Returns (start, end) of every solo in the token array *data* with vocabulary *chars*,
+    each running from its opening '###' to the end of its closing '###'. A solo left unfinished at the end of *data* is left out.
+    '''
+
+    if '#' not in chars:
+        return []
+    is_hash = np.asarray(data) == chars.index('#')
+    markers = np.flatnonzero(is_hash[:-2] & is_hash[1:-1] & is_hash[2:])
+    return [(int(start), int(end) + 3) for start, end in zip(markers[:-1], markers[1:])]
+
+
+def rowQueues(spans, n_seqs, n_steps, epoch=0):
+    '''
+    Returns *spans* dealt into up to *n_seqs* queues, one for each batch row, bucketed by length so every queue holds
+    about the same number of *n_steps* chunks: the longest solos are dealt first, each to the shortest queue.
+    A solo longer than a queue's share is split into pieces of that share first, each trained from a zero hidden state,
+    so one long solo cannot leave the other rows idle. The solos of every queue are then shuffled by *epoch*,
+    so a resumed epoch sees the same batches in the same order.
+    '''
+
+    n_rows = min(n_seqs, len(spans))
+    share = -(-sum(-(-(end - start - 1) // n_steps) for start, end in spans) // max(n_rows, 1)) * n_steps # Tokens a row gets
+    pieces = [(piece_start, min(piece_start + share + 1, end)) for start, end in spans for piece_start in range(start, end - 1, share)]
+
+    rng = np.random.default_rng(epoch)
+    queues = [[] for _ in range(n_rows)]
+    chunks = [0] * n_rows
+    for piece in sorted(pieces, key=lambda piece: piece[1] - piece[0], reverse=True):
+        row = int(np.argmin(chunks))
+        queues[row].append(piece)
+        chunks[row] += -(-(piece[1] - piece[0] - 1) // n_steps)
+    for queue in queues:
+        rng.shuffle(queue)
+    return queues
+
+
+def packedBatches(data, spans, n_seqs, n_steps, epoch=0):
+    '''
+    Create a generator that returns (x, y, lengths, rows, resets) for truncated BPTT over whole solos.
+    Every batch row trains on the solos of its queue from rowQueues() one after the other, *n_steps* steps at a time,
+    and a solo always starts at the start of a batch, so the row's hidden state can be reset for it.
+    x and y are the inputs and targets of the rows still training, padded with 0 to the longest, *lengths* their real
+    lengths, *rows* the indices of those rows and *resets* True for the rows starting a new solo.
+
+    Arguments:
+        data: token array the solos are taken from
+        spans: (start, end) of every solo in *data*, as from soloSpans()
+        n_seqs: Number of solos trained on side by side
+        n_steps: Number of sequence steps per batch
+        epoch: epoch number, which orders the solos of every row
+    '''
+
+    queues = rowQueues(spans, n_seqs, n_steps, epoch)
+    current = [None] * len(queues) # [start, end, offset] of the solo each row is on
+    while True:
+        rows, resets = [], []
+        for row, queue in enumerate(queues):
+            if current[row] is None or current[row][2] >= current[row][1] - current[row][0] - 1: # The last token is only a target
+                current[row] = [*queue.pop(), 0] if queue else None
+                if current[row] is None:
+                    continue
+                resets.append(True)
+            else:
+                resets.append(False)
+            rows.append(row)
+        if not rows:
+            return
+        lengths = np.array([min(n_steps, end - start - 1 - offset) for start, end, offset in (current[row] for row in rows)])
+        x = np.zeros((len(rows), lengths.max()), dtype=np.int64)
+        y = np.zeros((len(rows), lengths.max()), dtype=np.int64)
+        for ii, row in enumerate(rows):
+            start = current[row][0] + current[row][2]
+            x[ii, :lengths[ii]] = data[start:start + lengths[ii]]
+            y[ii, :lengths[ii]] = data[start + 1:start + lengths[ii] + 1]
+            current[row][2] += lengths[ii]
+        yield x, y, lengths, rows, resets
+
+
+def preparePacked(net, x, y, lengths, rows, resets):
+    '''
+    Returns the (inputs, targets, mask, rows, resets) *net* trains on for the packed batch x, y, where *mask* picks
+    the outputs of real tokens and *targets* holds only their targets.
+
+    The padded batch is run whole instead of as a PackedSequence, which the LSTM steps through several times slower
+    on CPU when the lengths differ. Padding only ever follows the last token of a solo, so it cannot change the outputs
+    of real tokens, and the hidden state it leaves is reset before the row's next solo.
+    '''
+
+    mask = torch.from_numpy((np.arange(x.shape[1]) < lengths[:, None]).reshape(-1))
+    return net.encodeInput(torch.from_numpy(x)), torch.from_numpy(y.reshape(-1))[mask], mask, rows, resets
+
+
+def packedStream(net, data, spans, n_seqs, n_steps, epoch=0, prefetch=0, monitor=None):
+    '''
+    Returns an iterator of prepared packed batches, prepared *prefetch* batches ahead on a background thread if *prefetch* is set.
+    Preparing each batch is timed as the 'encode' phase of *monitor* if given.
+    '''
+
+    prepare = lambda *batch: preparePacked(net, *batch)
+    if monitor is not None:
+        prepare = monitor.timed(prepare, 'encode')
+    batches = (prepare(*batch) for batch in packedBatches(data, spans, n_seqs, n_steps, epoch))
+    return prefetchItems(batches, prefetch) if prefetch else batches
+
+
+def rowsHidden(h, rows, resets):
+    '''Returns the hidden state of the batch *rows* taken from the hidden state *h* of every row, zero for the rows in *resets*'''
+
+    keep = torch.tensor([0.0 if reset else 1.0 for reset in resets]).view(1, -1, 1)
+    return tuple(each[:, rows] * keep for each in h)
+
+
+def storeHidden(h, rows, h_rows):
+    '''Returns the hidden state *h* of every row with the batch *rows* replaced by their new state *h_rows*'''
+
+    h = tuple(each.clone() for each in h)
+    for each, new in zip(h, h_rows):
+        each[:, rows] = new.detach()
+    return h
+
+
+def usefulTokens(data, spans, n_seqs, n_steps, packed):
+    '''
+    Returns (useful tokens, batch slots) for one epoch over *data*. Every row of a batch takes *n_steps* slots, and a slot
+    holds a useful token if it is trained on with a hidden state that has only seen the token's own solo. Contiguous batches
+    carry each row's state across every solo boundary in the row, while packed batches waste the padding after a solo
+    ends and the rows left idle once their queue runs out.
+    '''
+
+    if packed:
+        batches = sum(1 for batch in packedBatches(data, spans, n_seqs, n_steps))
+        return sum(end - start - 1 for start, end in spans), batches * min(n_seqs, len(spans)) * n_steps
+
+    xs, _ = batchViews(data, n_seqs, n_steps)
+    row_len = xs.shape[0] * n_steps
+    markers = np.array([start for start, end in spans] + ([spans[-1][1] - 3] if spans else []))
+    useful = 0
+    for row in range(n_seqs):
+        row_start = row * row_len
+        crossed = markers[(markers > row_start) & (markers + 3 <= row_start + row_len)] # Solo boundaries inside the row
+        useful += (crossed[0] + 3 - row_start) if len(crossed) else row_len
+    return useful, row_len * n_seqs
+
+
+def batchingReport(net, data, chars, n_seqs=128, n_steps=60, steps=20, clip=5):
+    '''
+    Trains a copy of *net* for *steps* steps with contiguous and with packed batches, prints the useful-token ratio
+    and tokens/sec of each and returns them as a dictionary. Only real tokens count towards tokens/sec.
+    '''
+
+    from Modules.TrainNN import batchStream, trainStep # Imported here, TrainNN imports this module
+
+    spans = soloSpans(data, chars)
+    report = {}
+    for name, packed in (('contiguous', False), ('packed', True)):
+        trial = copy.deepcopy(net)
+        trial.train()
+        opt = torch.optim.Adam(trial.parameters(), lr=0.001)
+        criterion = nn.CrossEntropyLoss()
+        if packed:
+            batches = packedStream(trial, data, spans, n_seqs, n_steps)
+        else:
+            batches = batchStream(trial, data, n_seqs, n_steps)
+        h = trial.init_hidden(n_seqs)
+        tokens, taken = 0, 0
+        start = None
+        for batch in batches:
+            if packed:
+                inputs, targets, mask, rows, resets = batch
+                loss, h_rows = trainStep(trial, opt, criterion, inputs, targets, rowsHidden(h, rows, resets), clip, mask)
+                h = storeHidden(h, rows, h_rows)
+            else:
+                inputs, targets = batch
+                loss, h = trainStep(trial, opt, criterion, inputs, targets, h, clip)
+            if start is None: # First step is a warm-up
+                start = time.perf_counter()
+                continue
+            tokens += len(targets)
+            taken += 1
+            if taken == steps:
+                break
+        useful, slots = usefulTokens(data, spans, n_seqs, n_steps, packed)
+        report[name] = {'useful_ratio': useful / slots, 'tokens_per_sec': tokens / (time.perf_counter() - start), 'steps': taken}
+
+    print('')
+    print('{:<12}{:>14}{:>14}'.format('Batching', 'Useful ratio', 'Tokens/sec'))
+    for name, row in report.items():
+        print('{:<12}{:>14.3f}{:>14.0f}'.format(name, row['useful_ratio'], row['tokens_per_sec']))
+    return report
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    from Modules.EncodedCorpus import loadCorpus
+    from Modules.CharacterRNN import CharRNN
+
+    chars, encoded = loadCorpus(sys.argv[1])
+    n_seqs = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    n_steps = int(sys.argv[3]) if len(sys.argv) > 3 else 60
+    batchingReport(CharRNN(chars, n_hidden=512, n_layers=3), encoded, chars, n_seqs, n_steps)
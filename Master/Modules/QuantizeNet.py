@@ -0,0 +1,180 @@
+'''
+    Export of quantized inference nets for the User generator
+
+    Run from the Master directory with:
+        python -m Modules.QuantizeNet <net name> [int8|fp16]
+'''
+
+from collections import Counter
+import json
+import multiprocessing
+import os
+import sys
+import time
+import torch
+import torch.nn.functional as F
+
+from Modules.CharacterRNN import netFromCheckpoint, quantizeNet
+from Modules.TrainNN import netCheckpoint
+
+
+QUANTIZATIONS = {'int8': 'dynamic_int8', 'fp16': 'float16'}
+
+
+def quantizedName(net_name, mode):
+    '''Returns the file name the *mode* ('int8' or 'fp16') version of *net_name* is saved as, e.g. ALIS_All_20.int8.net'''
+
+    return '{}.{}.net'.format(os.path.splitext(net_name)[0], mode)
+
+
+def loadCheckpoint(path):
+    '''Returns the checkpoint dictionary saved at *path*'''
+
+    return torch.load(path, weights_only=False) # Quantized state dicts hold packed weights, not just tensors
+
+
+def exportQuantized(net_name, mode='int8', net_dir='Nets'):
+    '''
+    Saves an int8 (LSTM and fully connected layers dynamically quantized) or float16 weight version
+    of the net *net_name* next to it in *net_dir*, and returns the new file name
+    '''
+
+    net = netFromCheckpoint(loadCheckpoint(os.path.join(net_dir, net_name)))
+    net.eval()
+    checkpoint = netCheckpoint(net)
+    if mode == 'int8':
+        checkpoint['state_dict'] = quantizeNet(net).state_dict()
+    elif mode == 'fp16':
+        checkpoint['state_dict'] = {name: value.half() for name, value in net.state_dict().items()}
+    else:
+        raise ValueError('Unknown quantization {}. Choose from {}.'.format(mode, ', '.join(QUANTIZATIONS)))
+    checkpoint['quantization'] = QUANTIZATIONS[mode]
+
+    quantized_name = quantizedName(net_name, mode)
+    with open(os.path.join(net_dir, quantized_name), 'wb') as f:
+        torch.save(checkpoint, f)
+    print('{} saved in the \'{}\' directory.'.format(quantized_name, net_dir))
+    return quantized_name
+
+
+def sampleText(net, size, seed, prime='### '):
+    '''Returns *size* characters sampled from *net* after *prime*, with the random generator seeded by *seed*'''
+
+    generator = torch.Generator().manual_seed(seed)
+    chars = list(prime)
+    with torch.no_grad():
+        h = net.init_hidden(1)
+        out, h = net.forward(net.encodeInput(torch.tensor([[net.char2int[ch] for ch in prime]])), h)
+        for ii in range(size):
+            char = torch.multinomial(F.softmax(out[-1], dim=0), 1, generator=generator)
+            chars.append(net.int2char[char.item()])
+            out, h = net.forward(net.encodeInput(char.view(1, 1)), h)
+    return ''.join(chars)
+
+
+def pitchHistogram(text):
+    '''Returns the relative frequency of each pitch character among the well-formed notes of *text*'''
+
+    pitches = Counter(note.split('!')[1] for note in text.split(' ') if note.count('!') == 2 and len(note.split('!')[1]) == 1)
+    total = sum(pitches.values())
+    return {pitch: count / total for pitch, count in pitches.items()} if total else {}
+
+
+def peakRssBytes():
+    '''Returns the peak resident set size of this process so far in bytes, or None where it cannot be read'''
+
+    try:
+        import resource # Only on Unix
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # Bytes on macOS, kilobytes on Linux
+
+
+def measureVariant(path, n_chars, seed):
+    '''
+    Loads the net at *path* in a fresh worker process and returns its load time, per-character sampling
+    latency, peak resident memory (overall and added by the net, None where it cannot be read) and a sample of *n_chars* characters
+    '''
+
+    rss_before = peakRssBytes()
+    start = time.perf_counter()
+    net = netFromCheckpoint(loadCheckpoint(path))
+    net.eval()
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    text = sampleText(net, n_chars, seed)
+    latency = (time.perf_counter() - start) / n_chars
+    peak_rss = peakRssBytes()
+    # The net's share is what loading and sampling added on top of importing torch
+    return {'load_time': load_time, 'char_latency': latency, 'peak_rss': peak_rss,
+            'net_rss': peak_rss - rss_before if peak_rss is not None else None, 'text': text}
+
+
+def distributionGap(float_net, quantized_net, text):
+    '''Returns the mean KL divergence from the float to the quantized next-character distributions along *text*'''
+
+    with torch.no_grad():
+        inputs = float_net.encodeInput(torch.tensor([[float_net.char2int[ch] for ch in text]]))
+        float_log = F.log_softmax(float_net.forward(inputs, float_net.init_hidden(1))[0], dim=1)
+        inputs = quantized_net.encodeInput(torch.tensor([[quantized_net.char2int[ch] for ch in text]]))
+        quantized_log = F.log_softmax(quantized_net.forward(inputs, quantized_net.init_hidden(1))[0], dim=1)
+    return F.kl_div(quantized_log, float_log, log_target=True, reduction='batchmean').item()
+
+
+def quantizationReport(net_name, modes=('int8', 'fp16'), net_dir='Nets', n_chars=1500, seed=0):
+    '''
+    Compares *net_name* with its quantized versions, exporting any that are missing, and returns the report.
+    Each version is measured in its own process so resident memory is not shared between them.
+    The report is also saved as <net>.quant_report.json in *net_dir*.
+    '''
+
+    names = {'float': net_name}
+    for mode in modes:
+        names[mode] = quantizedName(net_name, mode)
+        if not os.path.isfile(os.path.join(net_dir, names[mode])):
+            exportQuantized(net_name, mode, net_dir)
+
+    context = multiprocessing.get_context('spawn') # A fresh interpreter per version, so peak memory is its own
+    results = {}
+    for variant, name in names.items():
+        with context.Pool(1) as pool:
+            results[variant] = pool.apply(measureVariant, (os.path.join(net_dir, name), n_chars, seed))
+        results[variant]['file'] = name
+        results[variant]['file_size'] = os.path.getsize(os.path.join(net_dir, name))
+
+    float_net = netFromCheckpoint(loadCheckpoint(os.path.join(net_dir, net_name)))
+    float_net.eval()
+    float_pitches = pitchHistogram(results['float']['text'])
+    for variant in modes:
+        quantized_net = netFromCheckpoint(loadCheckpoint(os.path.join(net_dir, names[variant])))
+        quantized_net.eval()
+        results[variant]['mean_kl'] = distributionGap(float_net, quantized_net, results['float']['text'])
+        pitches = pitchHistogram(results[variant]['text'])
+        results[variant]['pitch_tv_distance'] = 0.5 * sum(abs(float_pitches.get(pitch, 0) - pitches.get(pitch, 0))
+                                                          for pitch in set(float_pitches) | set(pitches))
+    for result in results.values():
+        del result['text']
+
+    path = os.path.join(net_dir, '{}.quant_report.json'.format(os.path.splitext(net_name)[0]))
+    with open(path, 'w') as report_file:
+        json.dump(results, report_file, indent=1)
+
+    print('')
+    print('{:>7}  {:>9}  {:>11}  {:>13}  {:>12}  {:>9}  {:>8}'.format(
+        'version', 'size (MB)', 'ms per char', 'peak RSS (MB)', 'net RSS (MB)', 'mean KL', 'pitch TV'))
+    for variant, result in results.items():
+        print('{:>7}  {:>9.2f}  {:>11.3f}  {:>13}  {:>12}  {:>9}  {:>8}'.format(
+            variant, result['file_size'] / 2**20, result['char_latency'] * 1000,
+            '{:.1f}'.format(result['peak_rss'] / 2**20) if result['peak_rss'] is not None else '-',
+            '{:.1f}'.format(result['net_rss'] / 2**20) if result['net_rss'] is not None else '-',
+            '{:.2e}'.format(result['mean_kl']) if 'mean_kl' in result else '-',
+            '{:.3f}'.format(result['pitch_tv_distance']) if 'pitch_tv_distance' in result else '-'))
+    print('Report saved to {}'.format(path))
+    return results
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    quantizationReport(sys.argv[1], modes=sys.argv[2:] or ('int8', 'fp16'))
@@ -0,0 +1,70 @@
+'''
+    ResourceGovernor class used to limit the load training puts on a machine
+'''
+
+import time
+import torch
+
+
+class ResourceGovernor():
+
+    def __init__(self, max_threads=None, cpu_target=None, temp_sensor=None, temp_limit=None, poll_interval=5):
+        '''
+        Initiates the ResourceGovernor object. With no arguments it does not throttle at all.
+
+        Attributes:
+            __max_threads: cap on torch intra-op threads (None leaves torch's default)
+            __cpu_target: percentage of wall time the training loop may spend working (None for no limit)
+            __temp_sensor: file holding the temperature in millidegrees, e.g. /sys/class/thermal/thermal_zone0/temp
+            __temp_limit: temperature in degrees above which training pauses
+            __poll_interval: seconds between temperature readings while paused
+            __throttled: seconds spent throttling so far
+            __last_check: time of the previous throttle() call
+        '''
+
+        self.__max_threads = max_threads
+        self.__cpu_target = cpu_target
+        self.__temp_sensor = temp_sensor
+        self.__temp_limit = temp_limit
+        self.__poll_interval = poll_interval
+        self.__throttled = 0.0
+        self.__last_check = None
+
+    def get_throttled(self):
+        '''Returns the seconds spent throttling so far'''
+
+        return self.__throttled
+
+    def apply(self):
+        '''Applies the thread cap and starts timing the training loop'''
+
+        if self.__max_threads is not None:
+            torch.set_num_threads(self.__max_threads)
+        self.__last_check = time.perf_counter()
+
+    def readTemperature(self):
+        '''Returns the temperature of the sensor file in degrees'''
+
+        with open(self.__temp_sensor, 'r') as sensor:
+            return int(sensor.read().strip()) / 1000
+
+    def throttle(self):
+        '''Pauses if the machine is too hot or the loop has worked more than its share of time since the last call'''
+
+        now = time.perf_counter()
+        if self.__last_check is None:
+            self.__last_check = now
+        busy = now - self.__last_check
+
+        pausing = False
+        if self.__cpu_target is not None and self.__cpu_target < 100:
+            time.sleep(busy * (100 / self.__cpu_target - 1)) # Sleep so work fills only *cpu_target* percent of the time
+            pausing = True
+        if self.__temp_sensor is not None and self.__temp_limit is not None:
+            while self.readTemperature() > self.__temp_limit:
+                time.sleep(self.__poll_interval)
+                pausing = True
+
+        self.__last_check = time.perf_counter()
+        if pausing:
+            self.__throttled += self.__last_check - now
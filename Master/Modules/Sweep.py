@@ -0,0 +1,183 @@
+'''
+    Non-interactive hyperparameter sweeps run as parallel training trials
+
+    Run from the Master directory with:
+        python -m Modules.Sweep <spec file>
+
+    The spec file is JSON, for example:
+        {"name": "small_nets", "dataset": "All.txt", "search": "grid", "epochs": 5,
+         "params": {"n_hidden": [128, 256], "lr": [0.001, 0.003]},
+         "cores_per_trial": 2, "max_parallel": 4, "val_every": 20, "val_batches": 8, "grace_steps": 40}
+    With "search": "random", "trials" configs are drawn instead. A parameter may then also be
+    {"min": a, "max": b} for a uniform draw, with "log": true for a log-uniform one or "int": true for integers.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import torch
+
+from Modules.CharacterRNN import CharRNN, EmbeddingCharRNN
+from Modules.EncodedCorpus import loadCorpus
+from Modules.TrainNN import train
+from Modules.Validator import Validator
+
+
+DEFAULT_CONFIG = {'n_hidden': 512, 'n_layers': 3, 'n_seqs': 128, 'n_steps': 60, 'lr': 0.001,
+                  'drop_prob': 0.5, 'clip': 5, 'use_embedding': False}
+
+
+class StopTrial(Exception):
+    '''Raised inside a trial whose validation loss falls behind the other trials'''
+
+
+class SweepValidator(Validator):
+
+    def __init__(self, trial_id, peer_losses, grace_steps, **kwargs):
+        '''
+        Initiates the SweepValidator object, a Validator stopping its trial early when it is weak.
+
+        Attributes:
+            trial_id: index of the trial being validated
+            peer_losses: dictionary shared between trials mapping (step, trial_id) to val loss
+            grace_steps: steps before a trial may be stopped
+            last_step: most recent training step seen
+            best_loss: lowest validation loss so far
+        '''
+
+        super().__init__(**kwargs)
+        self.trial_id = trial_id
+        self.peer_losses = peer_losses
+        self.grace_steps = grace_steps
+        self.last_step = 0
+        self.best_loss = math.inf
+
+    def due(self, counter):
+        '''Records *counter* and returns whether validation should run'''
+
+        self.last_step = counter
+        return super().due(counter)
+
+    def report(self, epoch, epochs, counter, loss, val_loss):
+        '''Reports the losses, then stops the trial if it is worse than the median of the other trials at this step'''
+
+        super().report(epoch, epochs, counter, loss, val_loss)
+        self.best_loss = min(self.best_loss, val_loss)
+        self.peer_losses[(counter, self.trial_id)] = self.best_loss # One key a trial, so trials never overwrite each other
+        others = sorted(value for (step, trial), value in self.peer_losses.items() if step == counter and trial != self.trial_id)
+        if counter >= self.grace_steps and others and self.best_loss > others[len(others) // 2]:
+            raise StopTrial()
+
+
+def expandSpec(spec):
+    '''Returns the list of trial configs described by *spec*'''
+
+    params = spec['params']
+    if spec.get('search', 'grid') == 'grid':
+        names = sorted(params)
+        return [dict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+
+    rng = random.Random(spec.get('seed', 0))
+    configs = []
+    for _ in range(spec['trials']):
+        config = {}
+        for name, choices in sorted(params.items()):
+            if isinstance(choices, list):
+                config[name] = rng.choice(choices)
+            elif choices.get('log'):
+                config[name] = math.exp(rng.uniform(math.log(choices['min']), math.log(choices['max'])))
+            elif choices.get('int'):
+                config[name] = rng.randint(choices['min'], choices['max'])
+            else:
+                config[name] = rng.uniform(choices['min'], choices['max'])
+        configs.append(config)
+    return configs
+
+
+def runTrial(trial_id, config, spec, core_sets, peer_losses):
+    '''Trains one trial pinned to a free set of cores and returns its leaderboard entry'''
+
+    cores = core_sets.get()
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(len(cores))
+        torch.manual_seed(spec.get('seed', 0))
+
+        full = dict(DEFAULT_CONFIG)
+        full.update(config)
+        chars, encoded = loadCorpus(spec['dataset'])
+        if full['use_embedding']:
+            net = EmbeddingCharRNN(chars, full['n_hidden'], full['n_layers'], drop_prob=full['drop_prob'])
+        else:
+            net = CharRNN(chars, full['n_hidden'], full['n_layers'], drop_prob=full['drop_prob'])
+        validator = SweepValidator(trial_id, peer_losses, spec.get('grace_steps', 0),
+                                   every_steps=spec.get('val_every', 50), max_batches=spec.get('val_batches', 8))
+
+        stopped = False
+        start = time.perf_counter()
+        try:
+            train(net, encoded, epochs=spec.get('epochs', 1), n_seqs=full['n_seqs'], n_steps=full['n_steps'],
+                  lr=full['lr'], clip=full['clip'], print_every=spec.get('val_every', 50), validator=validator)
+        except StopTrial:
+            stopped = True
+        wall_time = time.perf_counter() - start
+        return {'trial': trial_id, 'config': config, 'val_loss': validator.best_loss,
+                'tokens_per_sec': validator.last_step * full['n_seqs'] * full['n_steps'] / wall_time,
+                'wall_time': wall_time, 'steps': validator.last_step, 'stopped_early': stopped, 'cores': sorted(cores)}
+    except Exception as err:
+        return {'trial': trial_id, 'config': config, 'val_loss': math.inf, 'error': '{}: {}'.format(type(err).__name__, err)}
+    finally:
+        core_sets.put(cores)
+
+
+def runSweep(spec, out_dir='Sweeps'):
+    '''Runs every trial of *spec* in a bounded process pool and returns the leaderboard, best trial first'''
+
+    configs = expandSpec(spec)
+    cores_per_trial = spec.get('cores_per_trial', 1)
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    n_slots = max(1, min(spec.get('max_parallel', len(configs)), len(available) // cores_per_trial))
+
+    loadCorpus(spec['dataset']) # Compile the training set once before the trials start
+    manager = multiprocessing.Manager()
+    core_sets = manager.Queue()
+    for slot in range(n_slots):
+        core_sets.put(set(available[slot * cores_per_trial:(slot + 1) * cores_per_trial] or available))
+    peer_losses = manager.dict()
+
+    with ProcessPoolExecutor(n_slots) as pool:
+        futures = [pool.submit(runTrial, trial_id, config, spec, core_sets, peer_losses)
+                   for trial_id, config in enumerate(configs)]
+        leaderboard = sorted((future.result() for future in futures), key=lambda entry: entry['val_loss'])
+    manager.shutdown()
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, '{}_leaderboard.json'.format(spec.get('name', 'sweep')))
+    with open(path, 'w') as leaderboard_file:
+        # A trial that failed or never validated has no loss, saved as null since JSON has no infinity
+        json.dump([dict(entry, val_loss=entry['val_loss'] if math.isfinite(entry['val_loss']) else None) for entry in leaderboard],
+                  leaderboard_file, indent=1, allow_nan=False)
+
+    print('')
+    print('{:>5}  {:>9}  {:>11}  {:>9}  config'.format('trial', 'val loss', 'tokens/sec', 'wall (s)'))
+    for entry in leaderboard:
+        print('{:>5}  {:>9.4f}  {:>11.0f}  {:>9.1f}  {}{}'.format(
+            entry['trial'], entry['val_loss'], entry.get('tokens_per_sec', 0), entry.get('wall_time', 0),
+            json.dumps(entry['config'], sort_keys=True), ' (stopped early)' if entry.get('stopped_early') else
+            ' ({})'.format(entry['error']) if 'error' in entry else ''))
+    print('Leaderboard saved to {}'.format(path))
+    return leaderboard
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    with open(sys.argv[1], 'r') as spec_file:
+        runSweep(json.load(spec_file))
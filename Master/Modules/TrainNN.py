@@ -6,9 +6,19 @@ import torch
 import torch.optim as optim
 import torch.nn as nn
 import torch.nn.functional as F
-from Modules.CharacterRNN import CharRNN
-from Modules.CharacterRNN import one_hot_encode
+from Modules.CharacterRNN import CharRNN, EmbeddingCharRNN
+from Modules.CharacterRNN import one_hot_encode, netFromCheckpoint
+from Modules.ResourceGovernor import ResourceGovernor
+from Modules.EncodedCorpus import loadCorpus
+from Modules.BatchPipeline import prefetchBatches
+from Modules.Validator import Validator
+from Modules.Checkpointer import Checkpointer, setRngState
+from Modules.EventTokens import textFormat
+from Modules.PackedBatches import soloSpans, packedStream, rowsHidden, storeHidden, usefulTokens
+from Modules.TrainingMonitor import TrainingMonitor, noPhase
 import numpy as np
+import itertools
+import os
 import time
 
 def get_batches(arr, n_seqs, n_steps):
@@ -36,7 +46,36 @@ def get_batches(arr, n_seqs, n_steps):
         yield x, y
 
 
-def train(net, data, epochs=10, n_seqs=10, n_steps=50, lr=0.001, clip=5, val_frac=0.1, print_every=2):
+def prepareBatch(net, x, y):
+    '''Returns the (inputs, targets) tensors *net* trains on for the batch x, y'''
+
+    x = x.astype(np.int64) # Tokens may be stored as uint8
+    targets = torch.from_numpy(y.astype(np.int64)).view(-1)
+    return net.encodeInput(torch.from_numpy(x)), targets # One-hot for CharRNN, indices for EmbeddingCharRNN
+
+
+def batchStream(net, arr, n_seqs, n_steps, prefetch=0, monitor=None):
+    '''
+    Returns an iterator of prepared (inputs, targets) batches, prepared *prefetch* batches ahead on a background thread if *prefetch* is set.
+    Preparing each batch is timed as the 'encode' phase of *monitor* if given.
+    '''
+
+    prepare = lambda x, y: prepareBatch(net, x, y)
+    if monitor is not None:
+        prepare = monitor.timed(prepare, 'encode')
+    if prefetch:
+        return prefetchBatches(arr, n_seqs, n_steps, prepare, prefetch)
+    return (prepare(x, y) for x, y in get_batches(arr, n_seqs, n_steps))
+
+
+def trainedEpochs(epochs, print_every):
+    '''Returns the number of epochs train() runs for *epochs* requested, one fewer for every *print_every* of them'''
+
+    return epochs - (epochs // print_every) # Required due to nature of code for printing training and validation loss
+
+
+def train(net, data, epochs=10, n_seqs=10, n_steps=50, lr=0.001, clip=5, val_frac=0.1, print_every=2, governor=None, prefetch=0, validator=None,
+          checkpointer=None, resume=None, packed=False, monitor=None):
         '''
         Training a network
         
@@ -50,8 +89,23 @@ def train(net, data, epochs=10, n_seqs=10, n_steps=50, lr=0.001, clip=5, val_fra
             clip: gradient clipping
             val_frac: Fraction of data to hold out for validation
             print_every: Number of steps for printing training and validation loss
+            governor: ResourceGovernor limiting threads, CPU use or temperature (None for no throttling)
+            prefetch: Number of batches prepared ahead on a background thread (0 prepares them in the loop)
+            validator: Validator deciding when and how validation loss is found (None validates every *print_every* steps)
+            checkpointer: Checkpointer writing resumable checkpoints during training (None for no checkpoints)
+            resume: checkpoint dictionary to carry on training from (None to start from scratch)
+            packed: train on whole solos bucketed by length (see PackedBatches), with the hidden state reset
+                    at the start of every solo, instead of on *n_seqs* contiguous rows of the training set
+            monitor: TrainingMonitor timing each phase of training (None times them without logging)
         '''
         
+        if governor is None:
+            governor = ResourceGovernor()
+        governor.apply()
+
+        config = {'epochs': epochs, 'n_seqs': n_seqs, 'n_steps': n_steps, 'lr': lr, 'clip': clip,
+                  'val_frac': val_frac, 'print_every': print_every, 'prefetch': prefetch, 'packed': packed}
+
         net.train()
         opt = torch.optim.Adam(net.parameters(), lr=lr)
         criterion = nn.CrossEntropyLoss()
@@ -59,69 +113,136 @@ def train(net, data, epochs=10, n_seqs=10, n_steps=50, lr=0.001, clip=5, val_fra
         # Seperate data into training and validation data
         val_idx = int(len(data)*(1-val_frac))
         data, val_data = data[:val_idx], data[val_idx:]
+        spans = soloSpans(data, net.chars) if packed else None
+
+        if validator is None:
+            validator = Validator(every_steps=print_every)
+        validator.start(val_data, n_seqs, n_steps, fresh_log=resume is None)
+        if monitor is None:
+            monitor = TrainingMonitor()
+        monitor.start(fresh_log=resume is None)
             
         counter = 0
-        n_chars = len(net.chars)
-        iterations = epochs - (epochs // print_every) # Required due to nature of code for printing training and validation loss
+        start_epoch, start_batch = 0, 0
+        if resume is not None:
+            opt.load_state_dict(resume['optimizer'])
+            counter, start_epoch, start_batch = resume['step'], resume['epoch'], resume['batch']
+            setRngState(resume['rng'])
+        iterations = trainedEpochs(epochs, print_every)
+        position = (start_epoch, start_batch, counter, net.init_hidden(n_seqs)) # Where training would carry on from
         
-        for e in range(iterations):
-            time.sleep(10) # Added for processing spread to stop overheating
-            h = net.init_hidden(n_seqs)
-            
-            for x, y in get_batches(data, n_seqs, n_steps):
-                counter += 1
-                x = one_hot_encode(x, n_chars)
-                inputs, targets = torch.from_numpy(x), torch.from_numpy(y) # Turn one-hot-encoded data into torch tensors
-                
-                h = tuple([each.data for each in h]) # New variables for the hidden state, else it would backpropagate through entire training history
-                
-                net.zero_grad() # Set gradients to zero
-                
-                output, h = net.forward(inputs, h) # Pass inputs through the CharRNN object
-                
-                loss = criterion(output, targets.view(n_seqs*n_steps).type(torch.LongTensor)) # Calculate the loss
-                loss.backward() # Calculates gradients for each learnable parameter
-                
-                nn.utils.clip_grad_norm_(net.parameters(), clip) # Helps prevent the exploding gradient problem in RNNs /LSTMs.
-                
-                opt.step() # Updates learnable parameter based on gradient
-                
-                if counter % print_every == 0:
-                    '''Get validation loss'''
-                    val_h = net.init_hidden(n_seqs)
-                    val_losses = []
-                    for x, y in get_batches(val_data, n_seqs, n_steps):
-                        x = one_hot_encode(x, n_chars)
-                        x, y = torch.from_numpy(x), torch.from_numpy(y)
-                        val_h = tuple([each.data for each in val_h])
-                        inputs, targets = x, y
-                        output, val_h = net.forward(inputs, val_h)
-                        val_loss = criterion(output, targets.view(n_seqs*n_steps).type(torch.LongTensor))
-                        val_losses.append(val_loss.item())
-                    print('Epoch: {}/{}...'.format(e+1, epochs))
-                    print('Step: {}...'.format(counter))
-                    print('Loss: {:.4f}...'.format(loss.item()))
-                    print('Val Loss: {:.4f}'.format(np.mean(val_losses)))
+        try:
+            for e in range(start_epoch, iterations):
+                h = net.init_hidden(n_seqs)
+                if packed:
+                    batches = packedStream(net, data, spans, n_seqs, n_steps, e, prefetch, monitor)
+                else:
+                    batches = batchStream(net, data, n_seqs, n_steps, prefetch, monitor)
+                first_batch = 0
+                if resume is not None and e == start_epoch:
+                    # Skip the batches trained on before the checkpoint and pick up its hidden state
+                    batches = itertools.islice(batches, start_batch, None)
+                    first_batch = start_batch
+                    if start_batch:
+                        h = resume['hidden']
 
+                for b, batch in enumerate(monitor.iterate(batches, 'data'), first_batch):
+                    if packed:
+                        # Only the rows in the batch are stepped, each starting from zero at the start of its solo
+                        inputs, targets, mask, rows, resets = batch
+                        loss, h_rows = trainStep(net, opt, criterion, inputs, targets, rowsHidden(h, rows, resets), clip, mask, monitor)
+                        h = storeHidden(h, rows, h_rows)
+                    else:
+                        inputs, targets = batch
+                        loss, h = trainStep(net, opt, criterion, inputs, targets, h, clip, monitor=monitor)
+                    counter += 1
+                    position = (e, b + 1, counter, h)
+                    monitor.step(counter, len(targets), e+1, loss.detach()) # Starts or stops the profiler and logs metrics when due
 
-def trainNSaveRNN(dataset):
-    '''Trains using *dataset* and saves trained network model'''
+                    with monitor.phase('throttle'):
+                        governor.throttle() # Pauses only if a CPU or temperature limit is set
+
+                    if validator.due(counter):
+                        with monitor.phase('validation'):
+                            validator.validate(net, e+1, epochs, counter, loss.item()) # Runs without autograd, in eval mode
+
+                    if checkpointer is not None and checkpointer.due(counter):
+                        with monitor.phase('checkpoint'):
+                            checkpointer.save(netCheckpoint(net), opt, *position, config)
+        except KeyboardInterrupt:
+            if checkpointer is not None:
+                checkpointer.save(netCheckpoint(net), opt, *position, config, wait=True)
+                print('Training interrupted. Checkpoint saved to {}'.format(checkpointer.get_path()))
+            raise
+        finally:
+            validator.finish()
+            if checkpointer is not None:
+                checkpointer.finish()
+            monitor.finish(counter)
 
-    # get text from file
-    with open(r'Training_sets/{}'.format(dataset), "r") as importedtextfile:
-        text = importedtextfile.read()
+        if governor.get_throttled() > 0:
+            print('Time spent throttling: {:.1f}s'.format(governor.get_throttled()))
+        if packed: # Contiguous batches are compared with packed ones by running PackedBatches, not on every training run
+            useful, slots = usefulTokens(data, spans, n_seqs, n_steps, packed)
+            print('Useful-token ratio: {:.3f}'.format(useful / max(slots, 1)))
 
+
+def trainStep(net, opt, criterion, inputs, targets, h, clip, mask=None, monitor=None):
     '''
-    encode text and map each character to an integer and vice versa
-    create two dictionaries
-    int2char, maps integers to characters
-    char2int, maps characters to integers
+    Runs one optimisation step on a batch and returns the loss and the new hidden state. *mask* picks the outputs *targets* are for (None for all).
+    Each part of the step is timed as a phase of *monitor* if given.
     '''
 
-    chars = tuple(set(text))
-    int2char = dict(enumerate(chars))
-    char2int = {ch: ii for ii, ch in int2char.items()}
-    encoded = np.array([char2int[ch] for ch in text])
+    phase = monitor.phase if monitor is not None else noPhase
+    h = tuple([each.data for each in h]) # New variables for the hidden state, else it would backpropagate through entire training history
+    
+    net.zero_grad() # Set gradients to zero
+    
+    with phase('forward'):
+        output, h = net.forward(inputs, h) # Pass inputs through the CharRNN object
+        if mask is not None:
+            output = output[mask] # Leaves out the padding after the end of a solo
+        loss = criterion(output, targets) # Calculate the loss
+
+    with phase('backward'):
+        loss.backward() # Calculates gradients for each learnable parameter
+    
+    with phase('clip'):
+        nn.utils.clip_grad_norm_(net.parameters(), clip) # Helps prevent the exploding gradient problem in RNNs /LSTMs.
+    
+    with phase('optimizer'):
+        opt.step() # Updates learnable parameter based on gradient
+    return loss, h
+
+
+def netCheckpoint(net):
+    '''Returns the format in which network model is saved'''
+
+    checkpoint = {'n_hidden': net.n_hidden,
+                'n_layers': net.n_layers,
+                'state_dict':net.state_dict(),
+                'tokens': net.chars,
+                'input_format': net.input_format,
+                'text_format': net.text_format}
+    if net.input_format == 'embedding':
+        checkpoint['n_embed'] = net.n_embed
+    return checkpoint
+
+
+def saveNet(net, model_name):
+    '''Saves *net* in the 'Nets' directory as *model_name*'''
+
+    with open(r'Nets/{}'.format(model_name), 'wb') as f:
+        torch.save(netCheckpoint(net), f)
+
+    print('{} saved in the \'Nets\' directory.'.format(model_name))
+
+
+def trainNSaveRNN(dataset):
+    '''Trains using *dataset* and saves trained network model'''
+
+    # Memory-map the training set, compiling it to tokens first if it is new or has changed
+    chars, encoded = loadCorpus(dataset)
 
 
     # Delete existing network if one exists
@@ -142,19 +263,94 @@ def trainNSaveRNN(dataset):
             print('Invalid number of epochs entered.')
             print('')
         
+    # Get CPU limit
+    cpu_target = None
+    invalid_target = True
+    while invalid_target:
+        target = input('Limit CPU use to a percentage? (Enter for no limit) ')
+        if target == '':
+            invalid_target = False
+        elif target.isdigit() and 0 < int(target) <= 100:
+            cpu_target = int(target)
+            invalid_target = False
+        else:
+            print('Percentage must be a whole number from 1 to 100.')
+
+    # Get input format
+    use_embedding = input('Feed characters through an embedding instead of one-hot vectors? (y/n) ') == 'y'
+
+    # Get batching
+    packed = input('Train on whole solos bucketed by length, resetting the hidden state between solos? (y/n) ') == 'y'
+
+    # Get profiling window
+    profile_steps = None
+    invalid_steps = True
+    while invalid_steps:
+        steps = input('Profile training steps? (Enter for none, or first-last, e.g. 20-30) ')
+        first, _, last = steps.partition('-')
+        if steps == '':
+            invalid_steps = False
+        elif first.isdigit() and last.isdigit() and 0 < int(first) <= int(last):
+            profile_steps = (int(first), int(last))
+            invalid_steps = False
+        else:
+            print('Steps must be two whole numbers from 1, the first no greater than the last.')
+
     model_name = 'ALIS_{}_{}.net'.format(dataset[:-4], epos) # Uses *dataset* and epochs chosen to form network model name 
-    net = CharRNN(chars, n_hidden=512, n_layers=3) # Initialize the network
+    if use_embedding:
+        net = EmbeddingCharRNN(chars, n_hidden=512, n_layers=3) # Initialize the network
+    else:
+        net = CharRNN(chars, n_hidden=512, n_layers=3) # Initialize the network
+    net.text_format = textFormat(dataset) # Lets the User decode what the net samples
     n_seqs, n_steps = 128, 60 # Batchsize and character per mini-batch
-    train(net, encoded, epochs=epos, n_seqs=n_seqs, n_steps=n_steps, lr=0.001, print_every=10)
+    governor = ResourceGovernor(cpu_target=cpu_target)
+    validator = Validator(every_steps=10, log_path=r'Nets/{}.losses.jsonl'.format(model_name[:-4])) # Loss history saved next to the net
+    checkpointer = Checkpointer(checkpointPath(model_name), every_steps=500, every_seconds=600,
+                                info={'dataset': dataset, 'model_name': model_name, 'cpu_target': cpu_target})
+    monitor = trainingMonitor(model_name, profile_steps)
+    train(net, encoded, epochs=epos, n_seqs=n_seqs, n_steps=n_steps, lr=0.001, print_every=10, governor=governor, prefetch=4,
+          validator=validator, checkpointer=checkpointer, packed=packed, monitor=monitor)
 
-    # Format in which network model is saved
-    checkpoint = {'n_hidden': net.n_hidden,
-                'n_layers': net.n_layers,
-                'state_dict':net.state_dict(),
-                'tokens': net.chars}
+    saveNet(net, model_name)
+    removeCheckpoint(model_name)
 
-    # Saves the network
-    with open(r'Nets/{}'.format(model_name), 'wb') as f:
-        torch.save(checkpoint, f)
 
-    print('{} saved in the \'Nets\' directory.'.format(model_name))
+def resumeTraining(checkpoint_name):
+    '''Carries on training from the checkpoint *checkpoint_name* and saves the trained network model'''
+
+    check = torch.load(r'Checkpoints/{}'.format(checkpoint_name), weights_only=False)
+    config = check['config']
+    chars, encoded = loadCorpus(check['dataset'])
+    net = netFromCheckpoint(check) # Same input format and weights as when the checkpoint was written
+    model_name = check['model_name']
+
+    print('Resuming {} from epoch {}, step {}...'.format(model_name, check['epoch'] + 1, check['step']))
+    governor = ResourceGovernor(cpu_target=check['cpu_target'])
+    validator = Validator(every_steps=config['print_every'], log_path=r'Nets/{}.losses.jsonl'.format(model_name[:-4]))
+    checkpointer = Checkpointer(checkpointPath(model_name), every_steps=500, every_seconds=600,
+                                info={'dataset': check['dataset'], 'model_name': model_name, 'cpu_target': check['cpu_target']})
+    train(net, encoded, governor=governor, validator=validator, checkpointer=checkpointer, resume=check,
+          monitor=trainingMonitor(model_name), **config)
+
+    saveNet(net, model_name)
+    removeCheckpoint(model_name)
+
+
+def trainingMonitor(model_name, profile_steps=None):
+    '''Returns the TrainingMonitor of the net *model_name*, logging metrics next to it and profiling *profile_steps* if given'''
+
+    return TrainingMonitor(every_steps=10, log_path=r'Nets/{}.metrics.jsonl'.format(model_name[:-4]),
+                           profile_steps=profile_steps, trace_path=r'Nets/{}.trace.json'.format(model_name[:-4]))
+
+
+def checkpointPath(model_name):
+    '''Returns the path of the resumable checkpoint of the net *model_name*'''
+
+    return r'Checkpoints/{}.ckpt'.format(model_name[:-4])
+
+
+def removeCheckpoint(model_name):
+    '''Removes the checkpoint of *model_name* once its net has been saved'''
+
+    if os.path.exists(checkpointPath(model_name)):
+        os.remove(checkpointPath(model_name))
@@ -0,0 +1,207 @@
+'''
+    TrainingMonitor class timing the phases of training, with an optional torch.profiler window
+'''
+
+import contextlib
+import json
+import sys
+import threading
+import time
+import torch
+
+
+PHASES = ('data', 'encode', 'forward', 'backward', 'clip', 'optimizer', 'validation', 'checkpoint', 'throttle')
+
+
+def noPhase(name):
+    '''Times nothing. Stands in for TrainingMonitor.phase when training without a monitor'''
+
+    return contextlib.nullcontext()
+
+
+def peakRss():
+    '''Returns the peak resident set size of this process so far in MiB, or None where it cannot be read'''
+
+    try:
+        import resource # Only on Unix
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024 # Bytes on macOS, KiB on Linux
+
+
+class TrainingMonitor():
+
+    def __init__(self, every_steps=10, log_path=None, profile_steps=None, trace_path=None):
+        '''
+        Initiates the TrainingMonitor object.
+
+        Phases are timed exclusively: while a phase runs inside another on the same thread, such as 'encode' inside 'data'
+        when batches are not prefetched, only the inner one is counted. 'encode' runs on the prefetch thread when batches
+        are prefetched, overlapping the other phases, while 'data' is then only the time spent waiting for a batch.
+
+        Attributes:
+            __every_steps: write a metrics record every this many training steps
+            __log_path: JSON lines file the metrics records are appended to (None for no log)
+            __profile_steps: (first, last) training steps recorded by torch.profiler (None for no profiling)
+            __trace_path: file the profiler's Chrome trace is saved to (None to only print the summary table)
+            __totals: seconds spent in each phase since training started
+            __window: seconds spent in each phase since the previous record
+            __steps, __tokens: training steps taken and tokens trained on since training started
+            __window_steps, __window_tokens: the same since the previous record
+            __start, __window_start: times training and the current record's window started
+            __profiler: running torch.profiler.profile, while within *profile_steps*
+            __lock: guards the phase totals, which the prefetch thread also adds to
+            __local: per-thread stack of the phases running on that thread
+        '''
+
+        self.__every_steps = every_steps
+        self.__log_path = log_path
+        self.__profile_steps = profile_steps
+        self.__trace_path = trace_path
+        self.__totals = dict.fromkeys(PHASES, 0.0)
+        self.__window = dict.fromkeys(PHASES, 0.0)
+        self.__steps, self.__tokens = 0, 0
+        self.__window_steps, self.__window_tokens = 0, 0
+        self.__start, self.__window_start = None, None
+        self.__profiler = None
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def get_totals(self):
+        '''Returns the seconds spent in each phase so far'''
+
+        return dict(self.__totals)
+
+    def start(self, fresh_log=True):
+        '''Starts timing training. The log is emptied first unless *fresh_log* is False, as when training is resumed'''
+
+        self.__start = self.__window_start = time.perf_counter()
+        if self.__log_path is not None and fresh_log:
+            open(self.__log_path, 'w').close() # Start fresh metrics for this run
+
+    def add(self, name, seconds):
+        '''Adds *seconds* to the phase *name*'''
+
+        with self.__lock:
+            self.__totals[name] = self.__totals.get(name, 0.0) + seconds
+            self.__window[name] = self.__window.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Context manager timing the code it wraps as the phase *name*, pausing any phase it runs inside'''
+
+        if not hasattr(self.__local, 'stack'):
+            self.__local.stack = []
+        stack = self.__local.stack
+        now = time.perf_counter()
+        if stack:
+            outer, outer_start = stack[-1]
+            self.add(outer, now - outer_start)
+        stack.append((name, now))
+        try:
+            if self.__profiler is not None:
+                with torch.profiler.record_function(name): # Names the phase in the profiler trace
+                    yield
+            else:
+                yield
+        finally:
+            now = time.perf_counter()
+            self.add(name, now - stack.pop()[1])
+            if stack:
+                stack[-1] = (stack[-1][0], now) # The outer phase carries on from here
+
+    def timed(self, function, name):
+        '''Returns *function* with every call timed as the phase *name*'''
+
+        def timedFunction(*args):
+            with self.phase(name):
+                return function(*args)
+        return timedFunction
+
+    def iterate(self, iterable, name):
+        '''Generator yielding every item of *iterable*, timing the wait for each as the phase *name*'''
+
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            with self.phase(name):
+                item = next(iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def step(self, counter, tokens, epoch=None, loss=None):
+        '''
+        Counts training step *counter* of *epoch*, which trained on *tokens* tokens with loss *loss* (a tensor is only read
+        when a record is written). Starts or stops the profiler at the edges of the profiling window and writes
+        a metrics record every *every_steps* steps.
+        '''
+
+        self.__steps += 1
+        self.__tokens += tokens
+        self.__window_steps += 1
+        self.__window_tokens += tokens
+
+        if self.__profile_steps is not None:
+            first, last = self.__profile_steps
+            if counter + 1 == first and self.__profiler is None:
+                self.__profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+                self.__profiler.start()
+            elif counter == last and self.__profiler is not None:
+                self.stopProfiler()
+
+        if self.__every_steps and counter % self.__every_steps == 0:
+            self.record(counter, epoch, loss)
+
+    def stopProfiler(self):
+        '''Stops the profiler, prints its most expensive operators and saves its trace if a trace path is set'''
+
+        profiler, self.__profiler = self.__profiler, None
+        profiler.stop()
+        print(profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=15))
+        if self.__trace_path is not None:
+            profiler.export_chrome_trace(self.__trace_path)
+            print('Profiler trace saved to {}'.format(self.__trace_path))
+
+    def record(self, counter, epoch=None, loss=None):
+        '''Appends the metrics of the steps since the previous record to the log and starts a new window'''
+
+        now = time.perf_counter()
+        elapsed = max(now - self.__window_start, 1e-9)
+        with self.__lock:
+            phases = {name: round(seconds, 6) for name, seconds in self.__window.items()}
+            self.__window = dict.fromkeys(PHASES, 0.0)
+        record = {'step': counter, 'epoch': epoch, 'loss': None if loss is None else float(loss), 'time': time.time(), 'seconds': elapsed,
+                  'tokens_per_sec': self.__window_tokens / elapsed, 'steps_per_sec': self.__window_steps / elapsed,
+                  'peak_rss_mb': peakRss(), 'phases': phases}
+        self.__window_steps, self.__window_tokens, self.__window_start = 0, 0, now
+        if self.__log_path is not None:
+            with open(self.__log_path, 'a') as log_file:
+                log_file.write(json.dumps(record) + '\n')
+        return record
+
+    def finish(self, counter):
+        '''Stops the profiler if still running, logs a summary record and prints the time spent in each phase'''
+
+        if self.__profiler is not None:
+            self.stopProfiler()
+        if self.__start is None:
+            return None
+        elapsed = max(time.perf_counter() - self.__start, 1e-9)
+        summary = {'summary': True, 'step': counter, 'time': time.time(), 'seconds': elapsed,
+                   'tokens': self.__tokens, 'tokens_per_sec': self.__tokens / elapsed, 'steps_per_sec': self.__steps / elapsed,
+                   'peak_rss_mb': peakRss(), 'phases': {name: round(seconds, 6) for name, seconds in self.__totals.items()}}
+        if self.__log_path is not None:
+            with open(self.__log_path, 'a') as log_file:
+                log_file.write(json.dumps(summary) + '\n')
+
+        print('')
+        print('{:<12}{:>10}{:>8}'.format('Phase', 'Seconds', 'Share'))
+        for name, seconds in self.__totals.items():
+            if seconds > 0:
+                print('{:<12}{:>10.2f}{:>7.1f}%'.format(name, seconds, 100 * seconds / elapsed))
+        print('{} steps in {:.1f}s: {:.0f} tokens/sec, {:.2f} optimizer steps/sec, peak RSS {}'.format(
+            self.__steps, elapsed, summary['tokens_per_sec'], summary['steps_per_sec'],
+            '{:.0f} MiB'.format(summary['peak_rss_mb']) if summary['peak_rss_mb'] is not None else 'unknown'))
+        return summary
@@ -0,0 +1,160 @@
+'''
+    Validator class and validation worker functions
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import json
+import time
+import torch
+import torch.nn as nn
+import numpy as np
+
+from Modules.BatchPipeline import batchViews
+
+
+def validationLoss(net, xs, ys, indices):
+    '''
+    Returns the mean loss of *net* over the batches *indices* of the batch views xs, ys.
+    Runs in eval mode without autograd, carrying the hidden state only across consecutive batches.
+    '''
+
+    was_training = net.training
+    net.eval()
+    criterion = nn.CrossEntropyLoss()
+    losses = []
+    with torch.no_grad():
+        previous = None
+        for index in indices:
+            if previous is None or index != previous + 1:
+                h = net.init_hidden(xs.shape[1])
+            inputs = net.encodeInput(torch.from_numpy(xs[index].astype(np.int64)))
+            targets = torch.from_numpy(ys[index].astype(np.int64)).view(-1)
+            output, h = net.forward(inputs, h)
+            losses.append(criterion(output, targets).item())
+            previous = index
+    net.train(was_training)
+    return float(np.mean(losses)) if losses else float('nan')
+
+
+worker_batches = None # Validation batches (xs, ys, indices) held by an asynchronous validation worker
+
+
+def initValidationWorker(xs, ys, indices):
+    '''Stores the validation batches once in a validation worker process'''
+
+    global worker_batches
+    torch.set_num_threads(1) # Leave the remaining cores to training
+    worker_batches = (xs, ys, indices)
+
+
+def validateSnapshot(net):
+    '''Returns the validation loss of the weight snapshot *net* inside a validation worker process'''
+
+    xs, ys, indices = worker_batches
+    return validationLoss(net, xs, ys, indices)
+
+
+class Validator():
+
+    def __init__(self, every_steps=None, every_seconds=None, max_batches=None, asynchronous=False, log_path=None, seed=0):
+        '''
+        Initiates the Validator object.
+
+        Attributes:
+            __every_steps: run validation every this many training steps
+            __every_seconds: run validation once this many seconds have passed since the last run
+            __max_batches: evaluate only a fixed random subset of this many validation batches (None for all)
+            __asynchronous: evaluate a snapshot of the weights in a separate process instead of pausing training
+            __log_path: JSON lines file the loss history is appended to (None for no log)
+            __seed: seed choosing the subset of validation batches
+        '''
+
+        self.__every_steps = every_steps
+        self.__every_seconds = every_seconds
+        self.__max_batches = max_batches
+        self.__asynchronous = asynchronous
+        self.__log_path = log_path
+        self.__seed = seed
+        self.__batches = None
+        self.__last_run = None
+        self.__pool = None
+        self.__pending = []
+        self.__history = []
+
+    def get_history(self):
+        '''Returns the list of logged loss records'''
+
+        return self.__history
+
+    def start(self, val_data, n_seqs, n_steps, fresh_log=True):
+        '''
+        Chooses the validation batches from *val_data* and starts the worker if validating asynchronously.
+        The log is emptied first unless *fresh_log* is False, as when training is resumed.
+        '''
+
+        xs, ys = batchViews(val_data, n_seqs, n_steps)
+        indices = np.arange(len(xs))
+        if self.__max_batches is not None and self.__max_batches < len(xs):
+            indices = np.sort(np.random.RandomState(self.__seed).choice(len(xs), self.__max_batches, replace=False))
+        self.__batches = (xs, ys, indices.tolist())
+        self.__last_run = time.perf_counter()
+        if self.__log_path is not None and fresh_log:
+            open(self.__log_path, 'w').close() # Start a fresh loss history for this run
+        if self.__asynchronous:
+            self.__pool = ProcessPoolExecutor(1, initializer=initValidationWorker,
+                                              initargs=(np.ascontiguousarray(xs), np.ascontiguousarray(ys), indices.tolist()))
+
+    def due(self, counter):
+        '''Returns whether validation should run after training step *counter*'''
+
+        if self.__every_steps is not None and counter % self.__every_steps == 0:
+            return True
+        if self.__every_seconds is not None and time.perf_counter() - self.__last_run >= self.__every_seconds:
+            return True
+        return False
+
+    def validate(self, net, epoch, epochs, counter, loss):
+        '''Validates *net* after step *counter* with training loss *loss*, or sends a snapshot to the worker'''
+
+        self.__last_run = time.perf_counter()
+        if self.__asynchronous:
+            self.collect()
+            if not self.__pending: # Skip this run if the worker is still busy with the previous snapshot
+                snapshot = copy.deepcopy(net).cpu()
+                self.__pending.append((self.__pool.submit(validateSnapshot, snapshot), epoch, epochs, counter, loss))
+            return
+        val_loss = validationLoss(net, *self.__batches)
+        self.report(epoch, epochs, counter, loss, val_loss)
+
+    def collect(self, wait=False):
+        '''Reports every finished asynchronous validation, waiting for the rest if *wait*'''
+
+        still_pending = []
+        for future, epoch, epochs, counter, loss in self.__pending:
+            if wait or future.done():
+                self.report(epoch, epochs, counter, loss, future.result())
+            else:
+                still_pending.append((future, epoch, epochs, counter, loss))
+        self.__pending = still_pending
+
+    def finish(self):
+        '''Waits for outstanding validations and stops the worker'''
+
+        if self.__pool is not None:
+            self.collect(wait=True)
+            self.__pool.shutdown()
+            self.__pool = None
+
+    def report(self, epoch, epochs, counter, loss, val_loss):
+        '''Prints the losses and appends them to the log'''
+
+        print('Epoch: {}/{}...'.format(epoch, epochs))
+        print('Step: {}...'.format(counter))
+        print('Loss: {:.4f}...'.format(loss))
+        print('Val Loss: {:.4f}'.format(val_loss))
+        record = {'epoch': epoch, 'step': counter, 'loss': loss, 'val_loss': val_loss, 'time': time.time()}
+        self.__history.append(record)
+        if self.__log_path is not None:
+            with open(self.__log_path, 'a') as log_file:
+                log_file.write(json.dumps(record) + '\n')
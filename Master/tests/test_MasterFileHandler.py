@@ -0,0 +1,112 @@
+'''
+    Tests of FileHandler.pairNotes and compressText against the encoder they replaced
+
+    Run from the Master directory with:
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import unittest
+
+MASTER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MASTER_DIR)
+
+from Modules.MasterFileHandler import FileHandler
+from Modules.MidiReader import readNoteEvents, decodeNoteEvents
+
+
+MIDI_DIRS = [os.path.join(MASTER_DIR, 'Midi_training_data', midi_set) for midi_set in ('All', 'Rock')]
+
+
+def legacyCompressText(filer, solo):
+    '''
+    The compressText that pairNotes replaced, kept as the reference output. Takes [tick, pitch] for each note event
+    and ends every note at the next event on its pitch, scanning forward and deleting from the list.
+    Raises IndexError on a note that never ends.
+    '''
+
+    solo = [list(event) for event in solo]
+    comp_solo = []
+    while len(solo) != 0:
+        note = solo[0][1]
+        start = filer.toHexatridecimal(solo[0][0])[1:]
+        if start == '':
+            start = '0'
+        item1 = 1
+        while solo[item1][1] != note:
+            item1 += 1
+        end = filer.toHexatridecimal(solo[item1][0])[1:]
+        if end == '':
+            end = '0'
+        del solo[item1]
+        comp_solo.append([start, chr(int(note) + 26), end])
+        del solo[0]
+    return comp_solo
+
+
+def overlapsOnPitch(events):
+    '''Returns True if a note starts on a pitch that is already sounding in the [tick, pitch, is_on] *events*'''
+
+    sounding = set()
+    for tick, pitch, is_on in events:
+        if is_on and pitch in sounding:
+            return True
+        (sounding.add if is_on else sounding.discard)(pitch)
+    return False
+
+
+def midiFiles():
+    '''Returns the path of every bundled midi file'''
+
+    return [os.path.join(midi_dir, name) for midi_dir in MIDI_DIRS for name in sorted(os.listdir(midi_dir))
+            if name.lower().endswith('.mid')]
+
+
+class CompressTextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.filer = FileHandler('x.mid', 'x.txt')
+
+    def test_matches_legacy_encoder_on_bundled_files(self):
+        '''Every bundled file without overlapping notes on one pitch, which the old encoder misread, encodes as before'''
+
+        compared = 0
+        for path in midiFiles():
+            events = readNoteEvents(path, track=2).tolist()
+            if overlapsOnPitch(events):
+                continue
+            with self.subTest(path=os.path.basename(path)):
+                self.assertEqual(self.filer.compressText(events),
+                                 legacyCompressText(self.filer, [[tick, pitch] for tick, pitch, is_on in events]))
+                compared += 1
+        self.assertGreater(compared, 0)
+
+    def test_onset_order(self):
+        notes = self.filer.pairNotes([[0, 60, True], [10, 64, True], [20, 64, False], [30, 60, False]])
+        self.assertEqual(notes, [[0, 60, 30], [10, 64, 20]])
+
+    def test_velocity_zero_note_on_ends_note(self):
+        '''A note-on with velocity 0 ends the note, both in the MIDI reader and in CSV messages'''
+
+        track = bytes([0x00, 0x90, 60, 100, 0x60, 0x90, 60, 0x00, 0x00, 0xFF, 0x2F, 0x00]) # Note-on with velocity 0 at tick 96
+        events = decodeNoteEvents(track).tolist()
+        self.assertEqual(self.filer.pairNotes(events), [[0, 60, 96]])
+
+        csv_list = ['2, 0, Note_on_c, 0, 60, 100\n', '2, 96, Note_on_c, 0, 60, 0\n']
+        self.assertEqual(self.filer.pairNotes(self.filer.convertMessages(csv_list)), [[0, 60, 96]])
+
+    def test_unterminated_and_stray_events_are_dropped(self):
+        events = [[0, 60, True], [5, 62, False], [10, 64, True], [20, 64, False], [30, 67, True]]
+        self.assertEqual(self.filer.pairNotes(events), [[10, 64, 20]])
+        self.assertEqual(self.filer.compressText(events), [['A', chr(64 + 26), 'K']])
+        with self.assertRaises(IndexError):
+            legacyCompressText(self.filer, [[tick, pitch] for tick, pitch, is_on in events])
+
+    def test_overlapping_notes_on_one_pitch_pair_first_in_first_out(self):
+        events = [[0, 60, True], [10, 60, True], [20, 60, False], [30, 60, False]]
+        self.assertEqual(self.filer.pairNotes(events), [[0, 60, 20], [10, 60, 30]])
+
+
+if __name__ == '__main__':
+    unittest.main()
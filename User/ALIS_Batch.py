@@ -0,0 +1,165 @@
+'''
+    Non-interactive ALIS batch generation, writing many solos to MIDI in a pool of worker processes
+
+    Run from the User directory with:
+        python ALIS_Batch.py <job file> [workers]
+
+    The job file is JSON, for example:
+        {"name": "overnight", "net": "ALIS_All_20.net", "progression": [["a", 2], ["G", 2], ["C", 4]], "count": 1000,
+         "seed": 7, "output": "Generated_solos/overnight/solo_{index:04d}.mid"}
+    "key" (e.g. "A") may be given instead of "progression", whose chords may also be given without their bars.
+    The output pattern may use {index}, {seed}, {key} and {net}. Optional settings are "bars" and the sampling settings
+    "temperature", "top_k", "top_p" and "repetition_penalty", as for ALIS_Service, and "manifest", the path of the manifest.
+    The file may also hold a list of such jobs. Solo i of a job is sampled with seed "seed" + i, so any solo can be
+    generated again on its own. Each job's manifest lists every solo with its timings or the reason it failed, and is
+    saved next to its solos as <name>.manifest.json unless "manifest" is given.
+'''
+
+# Import all relevant modules
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+try:
+    import torch
+except ImportError: # Nets then run on the NumPy backend only
+    torch = None
+
+from Modules.KeyFinder import KeyFinder
+from Modules.UserFileHandler import Filer
+from Modules.Generator import generateNotesFromNet, registry
+from Modules.Sampler import Sampler
+
+
+def initWorker(threads):
+    '''Limits each worker to *threads* threads so the workers do not compete for cores. Runs inside a worker process.'''
+
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+def generateSolo(task):
+    '''
+    Samples the solo described by *task* and writes it to MIDI, returning its manifest entry with its timings
+    or the reason it failed. Runs inside a worker process, where every net is loaded by the first solo that uses it.
+    '''
+
+    start = time.perf_counter()
+    entry = {'index': task['index'], 'seed': task['seed'], 'path': task['path'], 'worker': os.getpid()}
+    try:
+        registry.get(task['net']) # Kept loaded by the worker for its later solos
+        entry['load_seconds'] = time.perf_counter() - start
+        random.seed(task['seed']) # Fitting notes to the scale moves some up or down at random
+        findkey = KeyFinder(pentakey=task['key'])
+        sampler = Sampler(temperature=task['temperature'], top_k=task['top_k'], top_p=task['top_p'],
+                          repetition_penalty=task['repetition_penalty'], seed=task['seed'])
+        if os.path.dirname(task['path']):
+            os.makedirs(os.path.dirname(task['path']), exist_ok=True)
+        converter = Filer('x.txt', task['path'])
+        with contextlib.redirect_stdout(io.StringIO()): # Filer prints every save
+            numed_notes = converter.notesToNums(generateNotesFromNet(task['net'], task['bars'], sampler))
+            entry['notes'] = converter.writeMidiStream(findkey.fitToScale([note])[0] for note in numed_notes)
+    except Exception as err:
+        entry['error'] = '{}: {}'.format(type(err).__name__, err) # writeMidiStream only replaces the solo once it is complete
+    entry['seconds'] = time.perf_counter() - start
+    return entry
+
+
+def jobKey(job, seed):
+    '''Returns the key the solos of *job* are fitted to, chosen with *seed* if more than one fits its progression'''
+
+    if 'key' in job:
+        return KeyFinder(pentakey=job['key']).get_pentakey()
+    progression = [chord if isinstance(chord, list) else [chord, 1] for chord in job['progression']]
+    return KeyFinder(progression=progression, rng=random.Random(seed)).get_pentakey()
+
+
+def jobTasks(job, key, seed):
+    '''Returns the task of every solo of *job*, fitted to *key* and sampled with seeds counting up from *seed*'''
+
+    tasks = []
+    for index in range(int(job.get('count', 1))):
+        tasks.append({'index': index, 'seed': seed + index, 'net': job['net'], 'key': key,
+                      'path': job['output'].format(index=index, seed=seed + index, key=key, net=os.path.splitext(job['net'])[0]),
+                      'bars': int(job['bars']) if job.get('bars') is not None else None,
+                      'temperature': float(job.get('temperature', 1.0)), 'top_k': job.get('top_k'), 'top_p': job.get('top_p'),
+                      'repetition_penalty': float(job.get('repetition_penalty', 1.0))})
+    return tasks
+
+
+def manifestPath(job, name, tasks):
+    '''Returns the path the manifest of *job*, called *name*, is saved to'''
+
+    if job.get('manifest'):
+        return job['manifest']
+    directory = os.path.dirname(tasks[0]['path'] if tasks else job.get('output', ''))
+    return os.path.join(directory, '{}.manifest.json'.format(name))
+
+
+def runBatch(jobs, workers=None):
+    '''
+    Generates every solo of *jobs* in a pool of *workers* processes (None for one a core), saves the manifest
+    of each job and returns the manifests
+    '''
+
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    manifests, tasks = [], []
+    for job_index, job in enumerate(jobs):
+        seed = job['seed'] if job.get('seed') is not None else random.SystemRandom().randrange(2 ** 31) # Recorded in the manifest
+        name = job.get('name', 'batch_{}'.format(job_index) if len(jobs) > 1 else 'batch')
+        manifest = {'name': name, 'job': job, 'seed': seed, 'solos': []}
+        try:
+            manifest['key'] = jobKey(job, seed)
+            job_tasks = jobTasks(job, manifest['key'], seed)
+        except Exception as err:
+            manifest['error'] = '{}: {}'.format(type(err).__name__, err)
+            job_tasks = []
+        manifest['path'] = manifestPath(job, name, job_tasks)
+        manifests.append(manifest)
+        tasks += [(job_index, task) for task in job_tasks]
+
+    start = time.perf_counter()
+    done, failed = 0, 0
+    with ProcessPoolExecutor(workers, initializer=initWorker, initargs=(threads,)) as pool:
+        futures = {pool.submit(generateSolo, task): (job_index, task) for job_index, task in tasks}
+        for future in as_completed(futures):
+            job_index, task = futures[future]
+            try:
+                entry = future.result()
+            except Exception as err: # The worker itself died
+                entry = {'index': task['index'], 'seed': task['seed'], 'path': task['path'],
+                         'error': '{}: {}'.format(type(err).__name__, err)}
+            manifests[job_index]['solos'].append(entry)
+            done += 1
+            failed += 'error' in entry
+            if done % max(1, len(tasks) // 20) == 0 or done == len(tasks):
+                print('{}/{} solos written, {} failed, {:.1f}s'.format(done - failed, len(tasks), failed, time.perf_counter() - start))
+    seconds = time.perf_counter() - start
+
+    for manifest in manifests:
+        manifest['solos'].sort(key=lambda entry: entry['index'])
+        written = [entry for entry in manifest['solos'] if 'error' not in entry]
+        manifest.update({'count': len(manifest['solos']), 'written': len(written), 'failed': len(manifest['solos']) - len(written),
+                         'workers': workers, 'seconds': seconds,
+                         'mean_solo_seconds': sum(entry['seconds'] for entry in written) / len(written) if written else None})
+        if os.path.dirname(manifest['path']):
+            os.makedirs(os.path.dirname(manifest['path']), exist_ok=True)
+        with open(manifest['path'], 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+        print('{}: {} of {} solos written{}. Manifest saved to {}'.format(
+            manifest['name'], manifest['written'], manifest['count'],
+            ' ({})'.format(manifest['error']) if 'error' in manifest else '', manifest['path']))
+    return manifests
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    with open(sys.argv[1], 'r') as job_file:
+        jobs = json.load(job_file)
+    runBatch(jobs if isinstance(jobs, list) else [jobs], int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,58 @@
+'''
+    Long-lived ALIS generation service reading JSON line requests from stdin
+'''
+
+# Import all relevant modules
+import json
+import sys
+import time
+
+from Modules.Generator import generateFromNet, generateBatchFromNet
+from Modules.Sampler import Sampler
+
+
+def handleRequest(request):
+    '''
+    Returns the response to *request*, a dictionary with:
+        net: name of the net within 'Nets' to generate with
+        count: number of solos to generate (default 1)
+        bars: optional number of bars after which each solo ends
+        temperature, top_k, top_p, repetition_penalty, seed: optional sampling settings (see Sampler)
+        id: optional value echoed back in the response
+    '''
+
+    start = time.perf_counter()
+    count = int(request.get('count', 1))
+    max_bars = int(request['bars']) if request.get('bars') is not None else None
+    sampler = Sampler(temperature=float(request.get('temperature', 1.0)), top_k=request.get('top_k'),
+                      top_p=request.get('top_p'), repetition_penalty=float(request.get('repetition_penalty', 1.0)),
+                      seed=request.get('seed'))
+    if count == 1:
+        solos = [generateFromNet(request['net'], max_bars, sampler)]
+    else:
+        solos = generateBatchFromNet(request['net'], count, max_bars, sampler)
+    return {'id': request.get('id'), 'solos': solos, 'seconds': time.perf_counter() - start}
+
+
+def serve(requests, responses):
+    '''Answers every JSON line in *requests* with one JSON line in *responses*'''
+
+    for line in requests:
+        if not line.strip():
+            continue
+        request = None
+        try:
+            request = json.loads(line)
+            response = handleRequest(request)
+        except Exception as err:
+            response = {'id': request.get('id') if isinstance(request, dict) else None,
+                        'error': '{}: {}'.format(type(err).__name__, err)}
+        responses.write(json.dumps(response) + '\n')
+        responses.flush()
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    # Nets stay loaded for the life of the process, so each request only pays for sampling
+    serve(sys.stdin, sys.stdout)
@@ -8,7 +8,8 @@ import os
 
 from Modules.KeyFinder import KeyFinder
 from Modules.UserFileHandler import Filer
-from Modules.Generator import generateFromNet
+from Modules.Generator import generateNotesFromNet
+from Modules.Sampler import Sampler
 
 
 class ALIS_Generator():
@@ -22,11 +23,13 @@ class ALIS_Generator():
         Attributes:
             __ALIS_on: Determines whether the program keeps running or closes
             __most_recent_key: Stores the most recent key used for writing solos
+            __sampler: Chooses each character of a solo with the current sampling settings
 
         """
 
         self.__ALIS_on = True
         self.__most_recent_key = ''
+        self.__sampler = Sampler()
 
         print('')
         print('')
@@ -67,6 +70,18 @@ class ALIS_Generator():
         self.__most_recent_key = newkey
 
 
+    def get_sampler(self):
+        '''Returns the value of __sampler'''
+
+        return self.__sampler
+
+
+    def change_sampler(self, new_sampler):
+        '''Sets __sampler to *new_sampler*'''
+
+        self.__sampler = new_sampler
+
+
     def displayContents(self, directory):
         '''Shows contents of *directory* directory'''
 
@@ -93,6 +108,7 @@ class ALIS_Generator():
         print('2: Listen back to generated solos')
         print('3: Delete a solo')
         print('4: Delete a net')
+        print('5: Change sampling settings')
         print('X: Quit program')
         print('')
         print('Enter value to proceed with task.')
@@ -110,6 +126,8 @@ class ALIS_Generator():
             self.deleteSolo()
         elif choice == '4':
             self.deleteNet()
+        elif choice == '5':
+            self.changeSamplingSettings()
         elif choice == 'X':
             self.turn_ALIS_off()
         else:
@@ -157,21 +175,61 @@ class ALIS_Generator():
                     break
             else:
                 try:
-                    gen_text = generateFromNet(net_name)
                     converter = Filer('x.txt', '{}/{}.mid'.format(directory2, solo_name))
-                    numed_list, last_note_end = converter.generatedToNums(gen_text)
-                    scaled = findkey.fitToScale(numed_list)
-                    converter.finishFinalMidi(scaled, last_note_end)
+                    numed_notes = converter.notesToNums(generateNotesFromNet(net_name, sampler=self.get_sampler()))
+                    # Each note is fitted to the scale and written as soon as it is sampled
+                    converter.writeMidiStream(findkey.fitToScale([note])[0] for note in numed_notes)
                     print('')
                     print('Midi writing successful. New solo saved as {}.mid'.format(solo_name))
                     solo_making = False
                     break
+                except KeyboardInterrupt: # writeMidiStream has removed the unfinished file
+                    print('')
+                    print('Solo generation cancelled.')
+                    break
                 except:
                     print('Net chosen was unable to produce a solo in the required format or is not in {}.'.format(directory1))
                     print('This could be because the net has not been trained enough.')
                     print('Try using a different model to generate your solo.')
                         
                 
+    def askSetting(self, question, current, convert, valid):
+        '''
+        Asks *question* until Enter (keeping *current*), 'none' (giving None) or a value
+        *convert* can read and *valid* accepts is entered, and returns the setting
+        '''
+
+        while True:
+            answer = input('{} (Enter to keep {}) '.format(question, current))
+            if answer == '':
+                return current
+            if answer == 'none':
+                return None
+            try:
+                value = convert(answer)
+                if valid(value):
+                    return value
+            except ValueError:
+                pass
+            print('Invalid value. Please try again...')
+
+
+    def changeSamplingSettings(self):
+        '''UI for choosing how each character of a solo is sampled'''
+
+        sampler = self.get_sampler()
+        print('Lower temperature, top-k or top-p make solos safer, higher ones more adventurous.')
+        print('A repetition penalty above 1 makes repeating recent characters less likely.')
+        print('Enter \'none\' to turn top-k, top-p or the seed off.')
+        temperature = self.askSetting('Temperature:', sampler.temperature, float, lambda value: value > 0) or 1.0
+        top_k = self.askSetting('Top-k:', sampler.top_k, int, lambda value: value > 0)
+        top_p = self.askSetting('Top-p:', sampler.top_p, float, lambda value: 0 < value <= 1)
+        penalty = self.askSetting('Repetition penalty:', sampler.repetition_penalty, float, lambda value: value > 0) or 1.0
+        seed = self.askSetting('Seed, for repeatable solos:', sampler.seed, int, lambda value: value >= 0)
+        self.change_sampler(Sampler(temperature, top_k, top_p, penalty, sampler.window, seed))
+        print('Sampling settings changed.')
+
+
     def chooseAndPlaybackSolo(self):
         '''UI for playback songs'''
 
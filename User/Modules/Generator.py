@@ -2,38 +2,229 @@
     Extra functions to do with generating MIDI message representative text
 '''
 
-import torch
 import numpy as np
-from Modules.CharacterRNN import CharRNN
+try:
+    import torch
+    import torch.nn.functional as F
+    from Modules.CharacterRNN import CharRNN
+    from Modules.ScriptedNet import ScriptedNet
+except ImportError: # Sampling then runs on the NumPy backend only
+    torch = None
+from Modules.ModelRegistry import ModelRegistry
+from Modules.NumpyNet import NumpyNet, numpyNetFromCheckpoint
+from Modules.TokenGrammar import grammarFor, START, END, MARKER
+from Modules.Sampler import Sampler
+from Modules.EventTokens import EVENT_FORMAT, eventToNote, noteText, toNoteText
 
 
-def generateFromNet(net_name):
-    '''Loads the network model with name *net_name* and returns a sample produced by the model'''
+END_OF_SOLO = ' ###'
+EVENT_END_OF_SOLO = '###' # Event text has no space before the marker
+SAMPLE_SIZES = {'notes': 1500, 'events': 450} # Most characters sampled for a solo, about 140 notes in either format
+BAR_TICKS = 640 # Ticks in a bar of the note text (3840 once the User scales ticks by 6)
 
-    check = torch.load(r'Nets/{}'.format(net_name))
-    net = CharRNN(check['tokens'], check['n_hidden'], check['n_layers'])
-    net.load_state_dict(check['state_dict'])
+registry = ModelRegistry() # Keeps nets loaded between generations
 
-    return sample(net, 1500)
 
-def sample(net, size, prime='### '):
-    '''Returns a sample of text generated by *net* of size *size* and starting with *prime*'''
-    
+def generateFromNet(net_name, max_bars=None, sampler=None):
+    '''
+    Gets the network model with name *net_name* and returns a solo produced by the model, kept to the note format.
+    Sampling stops at the end of the solo, or after *max_bars* bars if given, choosing characters with *sampler*.
+    '''
+
+    return '### ' + ''.join(note + ' ' for note in generateNotesFromNet(net_name, max_bars, sampler)) + '###'
+
+
+def generateNotesFromNet(net_name, max_bars=None, sampler=None):
+    '''Gets the network model with name *net_name* and returns a generator of the notes of a solo as they are sampled'''
+
+    net = registry.get(net_name)
+
+    return streamNotes(net, SAMPLE_SIZES[net.text_format], max_bars=max_bars, sampler=sampler)
+
+
+def generateBatchFromNet(net_name, n_solos, max_bars=None, sampler=None):
+    '''
+    Gets the network model with name *net_name* and returns *n_solos* samples produced by the model as one batch,
+    kept to the note format and each stopping at its end of solo marker, or after *max_bars* bars if given.
+    Characters are chosen with *sampler*. Solos of a net trained on the event format are returned in the note text format.
+    '''
+
+    net = registry.get(net_name)
+
+    solos = sampleBatch(net, n_solos, SAMPLE_SIZES[net.text_format], constrained=True, max_bars=max_bars, sampler=sampler)
+    if net.text_format == EVENT_FORMAT:
+        return [toNoteText(solo) for solo in solos]
+    return solos
+
+
+def toBackend(net, backend):
+    '''
+    Returns *net* ready to run on *backend*: 'numpy' turns a float torch net into a NumpyNet,
+    'torch' requires a torch net, and None leaves *net* as it is
+    '''
+
+    if backend == 'numpy' and not isinstance(net, NumpyNet):
+        if isinstance(net, ScriptedNet) or not hasattr(net.lstm, 'weight_ih_l0'):
+            raise ValueError('Only float nets can be run on the NumPy backend.')
+        return numpyNetFromCheckpoint({'tokens': net.chars, 'n_layers': net.n_layers, 'n_hidden': net.n_hidden,
+                                       'state_dict': net.state_dict(), 'input_format': net.input_format,
+                                       'text_format': net.text_format})
+    if backend == 'torch' and isinstance(net, NumpyNet):
+        raise ValueError('A NumpyNet has no PyTorch weights. Load the net with the torch backend.')
+    return net
+
+
+def sample(net, size, prime='### ', backend=None, constrained=False, sampler=None):
+    '''
+    Returns a sample of text generated by *net* of size *size* and starting with *prime*.
+    *backend* picks whether the net runs on 'torch' or 'numpy' (None keeps the backend *net* was loaded for).
+    If *constrained*, only characters continuing well-formed notes are sampled, so every note can be read back.
+    *sampler* chooses each character (None samples from the full distribution).
+    '''
+
+    net = toBackend(net, backend)
     net.eval() # Sets dropout layer to 'eval' mode.
-    
-    chars = [ch for ch in prime] # Run through *prime* characters
-    
-    h = net.init_hidden(1)
-    
-    for ch in prime:
-        char, h = net.predict(ch, h)
-    
-    chars.append(char)
-    
+    sampler = sampler if sampler is not None else Sampler()
+    grammar = grammarFor(net) if constrained else None
+    state = grammar.start(prime) if constrained else None
+    chars = list(prime) # Run through *prime* characters
+    history = []
+
+    probs, h = stepProbs(net, [[net.char2int[ch] for ch in prime]], net.init_hidden(1))
     # Keep passing in previous character and getting predictions.
+    for ii in range(size + 1):
+        char = sampler.choose(probs, [history], grammar.allowed(state) if constrained else None)
+        history.append(int(char[0, 0]))
+        chars.append(net.int2char[history[-1]])
+        if constrained:
+            state = grammar.advance(state, chars[-1])
+        if ii < size:
+            probs, h = stepProbs(net, char, h)
+
+    return ''.join(chars)
+
+
+def streamNotes(net, size, prime='### ', max_bars=None, backend=None, sampler=None):
+    '''
+    Generator yielding each note 'start!pitch!end' sampled by *net* as soon as its last character is sampled.
+    Sampling keeps to the grammar of the net's text format and stops at the end of solo marker, after *size* characters,
+    or at the first note after the first starting after *max_bars* bars, so no character is sampled only to be thrown away
+    and every solo holds at least one note.
+    Notes of a net trained on the event format are decoded to the note text format as they complete.
+    *sampler* chooses each character (None samples from the full distribution).
+    '''
+
+    net = toBackend(net, backend)
+    net.eval() # Sets dropout layer to 'eval' mode.
+    sampler = sampler if sampler is not None else Sampler()
+    grammar = grammarFor(net)
+    state = grammar.start(prime)
+    note = []
+    history = []
+    onset = 0 # Start tick of the previous event format note
+    kept = 0 # Notes yielded so far
+
+    probs, h = stepProbs(net, [[net.char2int[ch] for ch in prime]], net.init_hidden(1))
     for ii in range(size):
-        
-        char, h = net.predict(chars[-1], h)
-        chars.append(char)
-    
-    return ''.join(chars)
\ No newline at end of file
+        char = sampler.choose(probs, [history], grammar.allowed(state))
+        history.append(int(char[0, 0]))
+        ch = net.int2char[history[-1]]
+        state = grammar.advance(state, ch)
+        if state[0] == MARKER: # The grammar only allows '#' here as the start of the end of solo marker
+            return
+        note.append(ch)
+        if state[0] == START and state[1] == 0: # The note is complete
+            if net.text_format == EVENT_FORMAT:
+                start, pitch, end = eventToNote(note, onset)
+                onset, text = start, noteText(start, pitch, end)
+            else:
+                text = ''.join(note[:-1])
+            if max_bars is not None and kept and int(text.split('!')[0], 36) >= max_bars * BAR_TICKS:
+                return
+            yield text
+            kept += 1
+            note = []
+        probs, h = stepProbs(net, char, h)
+
+
+def stepProbs(net, x, h):
+    '''
+    Returns the next-character probabilities of *net* after the character indices *x* (n_seqs x n_steps)
+    and the new hidden state. A scripted net runs its compiled step, a NumpyNet its NumPy one and a CharRNN its forward pass.
+    '''
+
+    if isinstance(net, NumpyNet):
+        return net.stepProbs(np.asarray(x), h)
+    x = torch.as_tensor(x)
+    if isinstance(net, ScriptedNet):
+        return net.stepProbs(x, h)
+    with torch.no_grad():
+        out, h = net.forward(net.encodeInput(x), h)
+    return F.softmax(out.view(x.shape[0], x.shape[1], -1)[:, -1], dim=1), h
+
+
+def sampleBatch(net, n_solos, size, prime='### ', constrained=False, max_bars=None, sampler=None):
+    '''
+    Returns a list of *n_solos* samples generated together by *net*, each of at most *size* characters after *prime*.
+    Each stream stops on its own once it emits the end of solo marker. Needs PyTorch.
+    If *constrained*, every stream only samples characters continuing well-formed notes, and with *max_bars*
+    a stream also ends, with the marker added, at its first note after the first starting after that many bars.
+    *sampler* chooses each character (None samples from the full distribution).
+    '''
+
+    net.eval() # Sets dropout layer to 'eval' mode.
+    sampler = sampler if sampler is not None else Sampler()
+    events = net.text_format == EVENT_FORMAT
+    end_of_solo = EVENT_END_OF_SOLO if events else END_OF_SOLO
+    solos = [list(prime) for _ in range(n_solos)]
+    histories = [[] for _ in range(n_solos)] # Character indices sampled for each solo
+    onsets = [0] * n_solos # Start tick of the last note of each solo, for the event format
+    kept = [0] * n_solos # Notes completed in each solo
+    if constrained:
+        grammar = grammarFor(net)
+        states = [grammar.start(prime)] * n_solos # Grammar state of each solo
+
+    with torch.no_grad():
+        h = net.init_hidden(n_solos) # Shape (n_layers, n_solos, n_hidden)
+        prime_ints = torch.tensor([[net.char2int[ch] for ch in prime]] * n_solos)
+        probs, h = stepProbs(net, prime_ints, h)
+
+        active = torch.arange(n_solos) # Rows of the batch still generating, as indices into *solos*
+        for ii in range(size + 1):
+            masks = np.stack([grammar.allowed(states[solo_idx]) for solo_idx in active.tolist()]) if constrained else None
+            chars = sampler.choose(probs, [histories[solo_idx] for solo_idx in active.tolist()], masks)
+            finished = []
+            for row, (solo_idx, char) in enumerate(zip(active.tolist(), chars.view(-1).tolist())):
+                solo = solos[solo_idx]
+                histories[solo_idx].append(char)
+                solo.append(net.int2char[char])
+                if constrained:
+                    previous, states[solo_idx] = states[solo_idx], grammar.advance(states[solo_idx], solo[-1])
+                    if max_bars is not None and previous[0] == END and states[solo_idx][0] == START: # A note just completed
+                        if events:
+                            note_begin = len(solo) - 3
+                            onsets[solo_idx] = eventToNote(solo[note_begin:], onsets[solo_idx])[0]
+                            start = onsets[solo_idx]
+                        else:
+                            text = ''.join(solo)
+                            note_begin = text.rfind(' ', 0, len(text) - 1) + 1 # Where the note just completed begins
+                            start = int(text[note_begin:].split('!')[0], 36)
+                        if kept[solo_idx] and start >= max_bars * BAR_TICKS: # A solo keeps at least one note
+                            solo[note_begin:] = list('###') # Replace the note with the end of solo marker
+                            finished.append(row)
+                            continue
+                        kept[solo_idx] += 1
+                if len(solo) >= len(prime) + len(end_of_solo) and ''.join(solo[-len(end_of_solo):]) == end_of_solo:
+                    finished.append(row)
+            if finished:
+                # Drop finished streams from the batch
+                keep = torch.tensor([row for row in range(len(active)) if row not in finished], dtype=torch.long)
+                if len(keep) == 0:
+                    break
+                active, chars = active[keep], chars[keep]
+                h = tuple(each[:, keep].contiguous() for each in h)
+            if ii == size:
+                break
+            probs, h = stepProbs(net, chars, h)
+
+    return [''.join(solo) for solo in solos]
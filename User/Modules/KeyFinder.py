@@ -7,21 +7,27 @@ import random
 class KeyFinder:
 
 
-    def __init__(self):
+    def __init__(self, progression=None, pentakey=None, rng=None):
         '''
-            Initiates the KeyFinder object.
+            Initiates the KeyFinder object. The chord progression is asked for unless *progression* or *pentakey* is given.
 
             Attributes:
                 notes: array of valid notes
                 chord_chart: used to determine key of the song
+                rng: random.Random choosing between keys that fit the progression equally, instead of asking the user (None to ask)
                 progression: the chord progression of the song
                 pentakey: stores the key of the song
 
         '''
         self.notes = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
         self.chord_chart = self.genChordChart()
-        self.progression = self.userChordProg()
-        self.pentakey = self.findKey()
+        self.rng = rng
+        if pentakey is not None and pentakey not in self.notes:
+            raise ValueError('Unknown key {}. Keys are one of {}.'.format(pentakey, ' '.join(self.notes)))
+        if progression is None:
+            progression = [] if pentakey is not None else self.userChordProg()
+        self.progression = progression
+        self.pentakey = pentakey if pentakey is not None else self.findKey()
 
 
     def get_notes(self):
@@ -140,8 +146,15 @@ class KeyFinder:
             if isPossibleKey:
                 possibleKeys.append(key[0])
 
+        if not possibleKeys:
+            raise ValueError('No pentatonic key fits the chord progression.')
+
+        # Chooses one of the keys that fit without asking if a random generator was given
+        if len(possibleKeys) > 1 and self.rng is not None:
+            pentakey = self.rng.choice(possibleKeys)
+
         # Asks user for the key if finds more than one chord to which it fits
-        if len(possibleKeys) > 1:
+        elif len(possibleKeys) > 1:
             print('If you know in which of the following keys the song/solo part is in, please enter below. If not, enter \'x\'.')
             print(*possibleKeys)
             invalidKey = True
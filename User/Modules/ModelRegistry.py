@@ -0,0 +1,143 @@
+'''
+    The ModelRegistry class
+'''
+
+from collections import OrderedDict
+import os
+try:
+    import torch
+    from Modules.CharacterRNN import netFromCheckpoint
+    from Modules.ScriptedNet import ScriptedNet
+except ImportError: # Without PyTorch only nets exported for the NumPy backend can be loaded
+    torch = None
+from Modules.NumpyNet import loadNumpyNet, numpyNetFromCheckpoint
+
+
+QUANTIZED_SUFFIXES = ('.int8.net', '.fp16.net')
+SCRIPTED_SUFFIX = '.script.pt'
+NUMPY_SUFFIX = '.npz'
+# Exported inference versions of a net for each backend, in order of preference
+INFERENCE_SUFFIXES = {'torch': (SCRIPTED_SUFFIX,) + QUANTIZED_SUFFIXES,
+                      'numpy': (NUMPY_SUFFIX, '.fp16.net')}
+
+
+class ModelRegistry():
+
+    def __init__(self, net_dir='Nets', memory_budget=512 * 1024 * 1024, backend=None):
+        '''
+            Initiates the ModelRegistry class.
+
+            Attributes:
+                net_dir: directory the nets are loaded from
+                memory_budget: most bytes of weights kept loaded at once
+                backend: 'torch' to run nets with PyTorch or 'numpy' to load them as NumpyNets
+                         (defaults to 'torch' when PyTorch is installed)
+                nets: loaded nets by name as ((file loaded, mtime), size, net), least recently used first
+                stale: exported files already reported as older than their net, so each is only reported once
+
+        '''
+
+        self.net_dir = net_dir
+        self.memory_budget = memory_budget
+        self.backend = backend if backend is not None else 'torch' if torch is not None else 'numpy'
+        self.nets = OrderedDict()
+        self.stale = set()
+
+
+    def get_net_dir(self):
+        '''Returns net_dir'''
+
+        return self.net_dir
+
+
+    def get_memory_budget(self):
+        '''Returns memory_budget'''
+
+        return self.memory_budget
+
+
+    def get_backend(self):
+        '''Returns backend'''
+
+        return self.backend
+
+
+    def resolve(self, net_name):
+        '''
+        Returns the file actually loaded for *net_name*. With the torch backend this is its scripted sampling step
+        (e.g. ALIS_All_20.script.pt) if one was exported, else its int8 version, else its float16 version.
+        With the numpy backend it is its NumPy export (ALIS_All_20.npz), else its float16 version.
+        Failing those, it is *net_name* itself.
+        An exported version older than *net_name* was exported before the net was trained again, so it is skipped.
+        '''
+
+        base = os.path.splitext(net_name)[0]
+        source = os.path.join(self.get_net_dir(), net_name)
+        source_mtime = os.path.getmtime(source) if os.path.isfile(source) else None
+        for suffix in INFERENCE_SUFFIXES[self.get_backend()]:
+            export = os.path.join(self.get_net_dir(), base + suffix)
+            if not os.path.isfile(export):
+                continue
+            if source_mtime is not None and os.path.getmtime(export) < source_mtime:
+                if export not in self.stale:
+                    self.stale.add(export)
+                    print('Skipping {}, which is older than {}. Export the net again to use it.'.format(base + suffix, net_name))
+                continue
+            return base + suffix
+        return net_name
+
+
+    def get(self, net_name):
+        '''Returns the net *net_name* in eval mode, loading it only if it is not cached or its file has changed'''
+
+        file_name = self.resolve(net_name)
+        mtime = os.path.getmtime(os.path.join(self.get_net_dir(), file_name))
+        if net_name in self.nets and self.nets[net_name][0] == (file_name, mtime):
+            self.nets.move_to_end(net_name)
+            return self.nets[net_name][2]
+
+        net = self.loadNet(file_name)
+        size = os.path.getsize(os.path.join(self.get_net_dir(), file_name)) # Quantized and scripted nets keep their weights outside parameters()
+        self.nets[net_name] = ((file_name, mtime), size, net)
+        self.nets.move_to_end(net_name)
+        self.evict()
+        return net
+
+
+    def loadNet(self, net_name):
+        '''Loads the network model with name *net_name* from disk'''
+
+        if net_name.endswith(NUMPY_SUFFIX):
+            return loadNumpyNet(os.path.join(self.get_net_dir(), net_name))
+        if torch is None:
+            raise ImportError('PyTorch is needed to load {}. Export it for the NumPy backend in the Master first.'.format(net_name))
+        if net_name.endswith(SCRIPTED_SUFFIX):
+            return ScriptedNet(os.path.join(self.get_net_dir(), net_name))
+
+        # Quantized state dicts hold packed weights, which only load without weights_only
+        quantized = net_name.endswith(QUANTIZED_SUFFIXES)
+        check = torch.load(os.path.join(self.get_net_dir(), net_name), weights_only=not quantized)
+        if self.get_backend() == 'numpy':
+            return numpyNetFromCheckpoint(check)
+        net = netFromCheckpoint(check) # Builds a one-hot, embedding input or quantized net depending on the checkpoint
+        net.eval() # Sets dropout layer to 'eval' mode.
+        return net
+
+
+    def evict(self):
+        '''Drops least recently used nets until the cache fits the memory budget, always keeping the newest'''
+
+        while len(self.nets) > 1 and self.usedMemory() > self.get_memory_budget():
+            self.nets.popitem(last=False)
+
+
+    def usedMemory(self):
+        '''Returns the bytes of weights of every cached net'''
+
+        return sum(size for mtime, size, net in self.nets.values())
+
+
+    def forget(self, net_name):
+        '''Removes *net_name* from the cache if it is loaded'''
+
+        self.nets.pop(net_name, None)
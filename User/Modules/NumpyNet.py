@@ -0,0 +1,133 @@
+'''
+    The NumpyNet class, a CharRNN run with NumPy only, and functions building one from a checkpoint or an exported .npz file
+'''
+
+import json
+import numpy as np
+
+
+class NumpyNet():
+
+    def __init__(self, tokens, n_layers, n_hidden, state_dict, input_format='one_hot', text_format='notes'):
+        '''
+            Initiates the NumpyNet class from the weights of a CharRNN or EmbeddingCharRNN.
+
+            Attributes:
+                chars: tuple of the characters the net was trained on
+                int2char: dictionary mapping index to character
+                char2int: dictionary mapping character to index
+                n_layers: number of LSTM layers
+                n_hidden: size of the LSTM hidden state
+                text_format: text format the net was trained on, 'notes' or 'events'
+                input_table: n_chars x 4*n_hidden array, the first layer's input contribution to the gates for each
+                             character (one-hot input picks a column of the weights, an embedding is multiplied through once)
+                hidden_weights: first layer's n_hidden x 4*n_hidden recurrent weights
+                layer_weights: for every further layer, (input and recurrent weights stacked as (2*n_hidden) x 4*n_hidden, bias)
+                fc_weights: n_hidden x n_chars weights of the fully connected layer
+                fc_bias: bias of the fully connected layer
+
+        '''
+
+        self.chars = tuple(tokens)
+        self.int2char = dict(enumerate(self.chars))
+        self.char2int = {ch: ii for ii, ch in self.int2char.items()}
+        self.n_layers = n_layers
+        self.n_hidden = n_hidden
+        self.text_format = text_format
+
+        # Weights are stored transposed, so each step is a row vector times a contiguous matrix.
+        # Gates keep PyTorch's order: input, forget, cell, output
+        bias = state_dict['lstm.bias_ih_l0'] + state_dict['lstm.bias_hh_l0']
+        input_weights = state_dict['lstm.weight_ih_l0'].T
+        if input_format == 'embedding':
+            input_weights = state_dict['embedding.weight'] @ input_weights
+        self.input_table = np.ascontiguousarray(input_weights + bias)
+        self.hidden_weights = np.ascontiguousarray(state_dict['lstm.weight_hh_l0'].T)
+        self.layer_weights = []
+        for layer in range(1, n_layers):
+            stacked = np.concatenate([state_dict['lstm.weight_ih_l{}'.format(layer)],
+                                      state_dict['lstm.weight_hh_l{}'.format(layer)]], axis=1)
+            self.layer_weights.append((np.ascontiguousarray(stacked.T),
+                                       state_dict['lstm.bias_ih_l{}'.format(layer)] + state_dict['lstm.bias_hh_l{}'.format(layer)]))
+        self.fc_weights = np.ascontiguousarray(state_dict['fc.weight'].T)
+        self.fc_bias = state_dict['fc.bias']
+
+
+    def eval(self):
+        '''Does nothing, there is no dropout at inference. Kept so NumpyNet can be sampled like a CharRNN'''
+
+        return self
+
+
+    def init_hidden(self, n_seqs):
+        '''Returns a zero hidden and cell state of shape n_layers x n_seqs x n_hidden'''
+
+        return (np.zeros((self.n_layers, n_seqs, self.n_hidden), dtype=np.float32),
+                np.zeros((self.n_layers, n_seqs, self.n_hidden), dtype=np.float32))
+
+
+    def cellStep(self, gates, c):
+        '''Returns the new hidden and cell state from the pre-activation *gates* and the previous cell state *c*'''
+
+        n = self.n_hidden
+        sig = 1 / (1 + np.exp(-gates[:, :2 * n])) # Input and forget gates
+        out_gate = 1 / (1 + np.exp(-gates[:, 3 * n:]))
+        c = sig[:, n:] * c + sig[:, :n] * np.tanh(gates[:, 2 * n:3 * n])
+        return out_gate * np.tanh(c), c
+
+
+    def logits(self, x, h):
+        '''
+        Runs the character indices *x* (n_seqs x n_steps) through the net from the hidden/cell state *h*.
+        Returns the fully connected layer's output after the last step (n_seqs x n_chars) and the new hidden state.
+        '''
+
+        hidden, cell = (each.copy() for each in h)
+        for step in range(x.shape[1]):
+            hidden[0], cell[0] = self.cellStep(self.input_table[x[:, step]] + hidden[0] @ self.hidden_weights, cell[0])
+            for layer, (weights, bias) in enumerate(self.layer_weights, 1):
+                inputs = np.concatenate([hidden[layer - 1], hidden[layer]], axis=1)
+                hidden[layer], cell[layer] = self.cellStep(inputs @ weights + bias, cell[layer])
+        return hidden[-1] @ self.fc_weights + self.fc_bias, (hidden, cell)
+
+
+    def stepProbs(self, x, h):
+        '''Returns the next-character probabilities after the character indices *x* (n_seqs x n_steps) and the new hidden state'''
+
+        out, h = self.logits(np.asarray(x), h)
+        out = np.exp(out - out.max(axis=1, keepdims=True))
+        return out / out.sum(axis=1, keepdims=True), h
+
+
+    def predict(self, char, h=None):
+        '''
+        Given a character, predict the next character. Returns the predicted character and the hidden state.
+        '''
+
+        if h is None:
+            h = self.init_hidden(1)
+        p, h = self.stepProbs(np.array([[self.char2int[char]]]), h)
+        p = p.squeeze().astype(np.float64)
+        char = np.random.choice(len(self.chars), p=p/p.sum()) # Choose prediction (implements a factor of randomness)
+        return self.int2char[char], h
+
+
+def numpyNetFromCheckpoint(check):
+    '''Returns the NumpyNet for the checkpoint dictionary *check* of a float or float16 net'''
+
+    if check.get('quantization') == 'dynamic_int8':
+        raise ValueError('int8 nets hold packed weights. Use the net they were exported from.')
+    state_dict = {name: np.asarray(value.float().numpy() if hasattr(value, 'numpy') else value, dtype=np.float32)
+                  for name, value in check['state_dict'].items()}
+    return NumpyNet(check['tokens'], check['n_layers'], check['n_hidden'], state_dict, check.get('input_format', 'one_hot'),
+                    check.get('text_format', 'notes'))
+
+
+def loadNumpyNet(path):
+    '''Returns the NumpyNet saved at *path* by the Master's exportNumpy(), without needing PyTorch'''
+
+    with np.load(path, allow_pickle=False) as arrays:
+        vocab = json.loads(str(arrays['vocab']))
+        state_dict = {name: arrays[name].astype(np.float32) for name in arrays.files if name != 'vocab'}
+    return NumpyNet(vocab['tokens'], vocab['n_layers'], vocab['n_hidden'], state_dict, vocab['input_format'],
+                    vocab.get('text_format', 'notes'))
@@ -0,0 +1,120 @@
+'''
+    The Sampler class, choosing each next character from a net's probabilities with temperature, top-k, top-p
+    and repetition penalty
+'''
+
+import numpy as np
+try:
+    import torch
+except ImportError: # NumpyNet probabilities are then sampled with NumPy
+    torch = None
+
+
+class Sampler():
+
+    def __init__(self, temperature=1.0, top_k=None, top_p=None, repetition_penalty=1.0, window=16, seed=None):
+        '''
+            Initiates the Sampler class. The defaults sample from the net's full distribution.
+
+            Attributes:
+                temperature: divides the log-probabilities, so below 1 favours likely characters and above 1 evens them out
+                top_k: only the *top_k* most likely characters are sampled from (None for all)
+                top_p: only the smallest set of most likely characters holding *top_p* of the probability is sampled from (None for all)
+                repetition_penalty: divides the probability of every character among the last *window* sampled
+                window: number of previously sampled characters the repetition penalty looks at
+                seed: seed of the random generators, for reproducible samples (None for a random seed)
+                generator: torch.Generator used for torch probabilities
+                rng: numpy Generator used for NumPy probabilities
+
+        '''
+
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.repetition_penalty = repetition_penalty
+        self.window = window
+        self.seed = seed
+        self.generator = None
+        if torch is not None:
+            self.generator = torch.Generator()
+            if seed is not None:
+                self.generator.manual_seed(seed)
+            else:
+                self.generator.seed()
+        self.rng = np.random.default_rng(seed)
+
+
+    def recent(self, history):
+        '''Returns the last *window* character indices of each row of *history*, or None if no penalty applies'''
+
+        if history is None or self.repetition_penalty == 1.0 or self.window == 0 or len(history[0]) == 0:
+            return None
+        return [row[-self.window:] for row in history]
+
+
+    def choose(self, probs, history=None, mask=None):
+        '''
+        Returns the index of the next character for each row of *probs* (n_seqs x n_chars) as an n_seqs x 1 array
+        of the same kind (torch or NumPy).
+
+        Arguments:
+            probs: next-character probabilities from the net
+            history: list for each row of the character indices sampled so far, for the repetition penalty
+            mask: 1 for every character allowed next and 0 for the rest (n_chars, or n_seqs x n_chars).
+                  A row with no allowed character keeps its unmasked probabilities.
+        '''
+
+        recent = self.recent(history)
+        if isinstance(probs, np.ndarray):
+            return self.chooseNumpy(probs, recent, mask)
+
+        if mask is not None:
+            masked = probs * torch.as_tensor(mask, dtype=probs.dtype)
+            probs = torch.where(masked.sum(dim=1, keepdim=True) > 0, masked, probs)
+        logp = probs.log()
+        if recent is not None:
+            penalty = torch.zeros_like(logp).scatter_(1, torch.as_tensor(recent), 1.0)
+            logp = logp - penalty * float(np.log(self.repetition_penalty))
+        if self.temperature != 1.0:
+            logp = logp / self.temperature
+        if self.top_k is not None and self.top_k < logp.shape[1]:
+            kth = logp.topk(self.top_k, dim=1).values[:, -1:]
+            logp = logp.masked_fill(logp < kth, float('-inf'))
+        if self.top_p is not None and self.top_p < 1.0:
+            sorted_logp, order = logp.sort(dim=1, descending=True)
+            sorted_probs = sorted_logp.softmax(dim=1)
+            # Drop a character once the more likely ones already hold top_p, always keeping the most likely
+            drop = sorted_probs.cumsum(dim=1) - sorted_probs >= self.top_p
+            logp = logp.masked_fill(drop.scatter(1, order, drop), float('-inf'))
+        return torch.multinomial(logp.softmax(dim=1), 1, generator=self.generator)
+
+
+    def chooseNumpy(self, probs, recent=None, mask=None):
+        '''Returns the next character indices like choose(), for NumPy *probs* and the *recent* character indices of each row'''
+
+        probs = probs.astype(np.float64)
+        if mask is not None:
+            masked = probs * mask
+            probs = np.where(masked.sum(axis=1, keepdims=True) > 0, masked, probs)
+        with np.errstate(divide='ignore'):
+            logp = np.log(probs)
+        if recent is not None:
+            penalty = np.zeros_like(logp)
+            np.put_along_axis(penalty, np.asarray(recent), 1.0, axis=1)
+            logp = logp - penalty * np.log(self.repetition_penalty)
+        if self.temperature != 1.0:
+            logp = logp / self.temperature
+        if self.top_k is not None and self.top_k < logp.shape[1]:
+            kth = -np.partition(-logp, self.top_k - 1, axis=1)[:, self.top_k - 1:self.top_k]
+            logp = np.where(logp < kth, -np.inf, logp)
+        if self.top_p is not None and self.top_p < 1.0:
+            order = np.argsort(-logp, axis=1)
+            sorted_probs = np.exp(np.take_along_axis(logp, order, axis=1) - logp.max(axis=1, keepdims=True))
+            sorted_probs /= sorted_probs.sum(axis=1, keepdims=True)
+            drop = np.zeros_like(logp, dtype=bool)
+            np.put_along_axis(drop, order, np.cumsum(sorted_probs, axis=1) - sorted_probs >= self.top_p, axis=1)
+            logp = np.where(drop, -np.inf, logp)
+        p = np.exp(logp - logp.max(axis=1, keepdims=True))
+        p /= p.sum(axis=1, keepdims=True)
+        # Inverse transform sampling of every row at once
+        return (p.cumsum(axis=1) < self.rng.random((len(p), 1))).sum(axis=1, keepdims=True).clip(max=p.shape[1] - 1)
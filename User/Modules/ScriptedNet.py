@@ -0,0 +1,71 @@
+'''
+    The ScriptedNet class, a net's sampling step exported by the Master as a TorchScript module
+'''
+
+import json
+import numpy as np
+import torch
+
+
+class ScriptedNet():
+
+    def __init__(self, path):
+        '''
+            Initiates the ScriptedNet class from the file at *path*.
+
+            Attributes:
+                step: TorchScript module taking character indices and hidden/cell state and returning
+                      next-character probabilities and the new state
+                chars: tuple of the characters the net was trained on
+                int2char: dictionary mapping index to character
+                char2int: dictionary mapping character to index
+                n_layers: number of LSTM layers
+                n_hidden: size of the LSTM hidden state
+                text_format: text format the net was trained on, 'notes' or 'events'
+
+        '''
+
+        extra_files = {'vocab.json': ''}
+        self.step = torch.jit.load(path, _extra_files=extra_files)
+        self.step.eval()
+        vocab = json.loads(extra_files['vocab.json'])
+        self.chars = tuple(vocab['tokens'])
+        self.int2char = dict(enumerate(self.chars))
+        self.char2int = {ch: ii for ii, ch in self.int2char.items()}
+        self.n_layers = vocab['n_layers']
+        self.n_hidden = vocab['n_hidden']
+        self.text_format = vocab.get('text_format', 'notes')
+
+
+    def eval(self):
+        '''Does nothing, the step is always in eval mode. Kept so ScriptedNet can be sampled like a CharRNN'''
+
+        return self
+
+
+    def init_hidden(self, n_seqs):
+        '''Returns a zero hidden and cell state for *n_seqs* sequences'''
+
+        return (torch.zeros(self.n_layers, n_seqs, self.n_hidden),
+                torch.zeros(self.n_layers, n_seqs, self.n_hidden))
+
+
+    def stepProbs(self, x, h):
+        '''Returns the next-character probabilities after the character indices *x* (n_seqs x n_steps) and the new hidden state'''
+
+        with torch.no_grad():
+            probs, hidden, cell = self.step(x, *h)
+        return probs, (hidden, cell)
+
+
+    def predict(self, char, h=None):
+        '''
+        Given a character, predict the next character. Returns the predicted character and the hidden state.
+        '''
+
+        if h is None:
+            h = self.init_hidden(1)
+        p, h = self.stepProbs(torch.tensor([[self.char2int[char]]]), h)
+        p = p.numpy().squeeze()
+        char = np.random.choice(len(self.chars), p=p/p.sum()) # Choose prediction (implements a factor of randomness)
+        return self.int2char[char], h
@@ -0,0 +1,173 @@
+'''
+    The TokenGrammar and EventGrammar classes, the state machines over the note and event text formats used to constrain sampling
+'''
+
+import numpy as np
+
+from Modules.EventTokens import EVENT_FORMAT, isDelta, isPitch, isDuration
+
+
+BASE_36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SEPARATORS = ' !#'
+
+# Kinds of grammar state
+START = 0 # Reading the base-36 start tick (or the end of solo marker, if at the first character)
+PITCH = 1 # Expecting the pitch character
+PITCH_END = 2 # Expecting the '!' after the pitch
+END = 3 # Reading the base-36 end tick (the duration character in the event format)
+MARKER = 4 # Reading the '###' end of solo marker
+
+
+class TokenGrammar():
+
+    def __init__(self, chars, pitch_range=(0, 127), max_digits=5):
+        '''
+            Initiates the TokenGrammar class for the vocabulary *chars* of a net.
+            Notes are written 'start!pitch!end ' and solos end with '###', as in the training sets.
+
+            A grammar state is a tuple (kind, count, notes): the kind of state above, the characters read
+            so far of the current field, and the notes completed in the current solo.
+
+            Attributes:
+                n_chars: number of characters in the vocabulary
+                digits: mask of the base-36 digit characters
+                pitches: mask of the characters standing for a MIDI pitch within *pitch_range*
+                bang, space, hash: masks of the single separator characters
+                max_digits: most digits allowed in a start or end tick
+
+        '''
+
+        self.n_chars = len(chars)
+        self.digits = self.charMask(chars, lambda ch: ch in BASE_36)
+        self.pitches = self.charMask(chars, lambda ch: ch not in SEPARATORS and pitch_range[0] <= ord(ch) - 26 <= pitch_range[1])
+        self.bang = self.charMask(chars, lambda ch: ch == '!')
+        self.space = self.charMask(chars, lambda ch: ch == ' ')
+        self.hash = self.charMask(chars, lambda ch: ch == '#')
+        self.max_digits = max_digits
+        self.masks = {} # Masks already built, by the parts of the state they depend on
+
+
+    def charMask(self, chars, rule):
+        '''Returns a float array with 1 for every character of *chars* *rule* holds for and 0 for the rest'''
+
+        return np.array([1.0 if rule(ch) else 0.0 for ch in chars])
+
+
+    def start(self, prime):
+        '''Returns the grammar state after *prime*'''
+
+        state = (START, 0, 0)
+        for ch in prime:
+            state = self.advance(state, ch)
+        return state
+
+
+    def advance(self, state, ch):
+        '''Returns the grammar state after character *ch* is written in *state*'''
+
+        kind, count, notes = state
+        if kind == START:
+            if ch == '#':
+                return (MARKER, 1, notes)
+            if ch == '!':
+                return (PITCH, 0, notes)
+            return (START, count + 1, notes)
+        if kind == PITCH:
+            return (PITCH_END, 0, notes)
+        if kind == PITCH_END:
+            return (END, 0, notes)
+        if kind == END:
+            if ch == ' ':
+                return (START, 0, notes + 1)
+            return (END, count + 1, notes)
+        if ch == '#':
+            return (MARKER, count + 1, notes)
+        return (START, 0, 0) # The space after '###' begins a new solo
+
+
+    def allowed(self, state):
+        '''Returns the mask of the characters that may follow *state*'''
+
+        kind, count, notes = state
+        key = (kind, min(count, self.max_digits) if kind in (START, END, MARKER) else 0, kind == START and count == 0 and notes > 0)
+        if key not in self.masks:
+            if kind == START:
+                # A solo may only end once it holds a note, so it can always be turned into MIDI
+                mask = (self.digits if count < self.max_digits else 0) + (self.bang if count > 0 else 0) + (self.hash if key[2] else 0)
+            elif kind == PITCH:
+                mask = self.pitches
+            elif kind == PITCH_END:
+                mask = self.bang
+            elif kind == END:
+                mask = (self.digits if count < self.max_digits else 0) + (self.space if count > 0 else 0)
+            else:
+                mask = self.hash if count < 3 else self.space
+            self.masks[key] = mask * np.ones(self.n_chars)
+        return self.masks[key]
+
+
+class EventGrammar(TokenGrammar):
+
+    def __init__(self, chars, pitch_range=(0, 127)):
+        '''
+            Initiates the EventGrammar class for the vocabulary *chars* of a net trained on the event format.
+            Notes are written as an onset delta, pitch and duration character and solos end with '###'.
+            States are tuples (kind, count, notes) as for TokenGrammar, with count only used by MARKER.
+
+            Attributes:
+                n_chars: number of characters in the vocabulary
+                deltas: mask of the onset delta characters
+                pitches: mask of the characters standing for a MIDI pitch within *pitch_range*
+                durations: mask of the duration characters
+                space, hash: masks of the single separator characters
+
+        '''
+
+        self.n_chars = len(chars)
+        self.deltas = self.charMask(chars, isDelta)
+        self.pitches = self.charMask(chars, lambda ch: isPitch(ch) and pitch_range[0] <= ord(ch) - 26 <= pitch_range[1])
+        self.durations = self.charMask(chars, isDuration)
+        self.space = self.charMask(chars, lambda ch: ch == ' ')
+        self.hash = self.charMask(chars, lambda ch: ch == '#')
+        self.masks = {}
+
+
+    def advance(self, state, ch):
+        '''Returns the grammar state after character *ch* is written in *state*'''
+
+        kind, count, notes = state
+        if kind == START:
+            return (MARKER, 1, notes) if ch == '#' else (PITCH, 0, notes)
+        if kind == PITCH:
+            return (END, 0, notes)
+        if kind == END:
+            return (START, 0, notes + 1)
+        if ch == '#':
+            return (MARKER, count + 1, notes)
+        return (START, 0, 0) # The space after '###' begins a new solo
+
+
+    def allowed(self, state):
+        '''Returns the mask of the characters that may follow *state*'''
+
+        kind, count, notes = state
+        key = (kind, count if kind == MARKER else 0, kind == START and notes > 0)
+        if key not in self.masks:
+            if kind == START:
+                mask = self.deltas + (self.hash if key[2] else 0) # A solo may only end once it holds a note
+            elif kind == PITCH:
+                mask = self.pitches
+            elif kind == END:
+                mask = self.durations
+            else:
+                mask = self.hash if count < 3 else self.space
+            self.masks[key] = mask * np.ones(self.n_chars)
+        return self.masks[key]
+
+
+def grammarFor(net):
+    '''Returns the grammar of the text format *net* was trained on'''
+
+    if getattr(net, 'text_format', 'notes') == EVENT_FORMAT:
+        return EventGrammar(net.chars)
+    return TokenGrammar(net.chars)
@@ -0,0 +1,101 @@
+'''
+    Benchmarks of sampling from a synthetic net and of writing sampled text to MIDI, run offline
+
+    Run from the User directory with:
+        python -m Modules.UserBenchmark [save]
+    Results are saved to Benchmarks/user.results.json and compared with Benchmarks/user.baseline.json,
+    exiting with 1 if a benchmark is worse than its baseline by more than its tolerance. With save they become the baseline.
+'''
+
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import numpy as np
+import torch
+
+from Modules.BenchmarkReport import benchmark, timeRepeats, runFromCommandLine
+from Modules.CharacterRNN import CharRNN
+from Modules.EventTokens import BASE_36, noteText
+from Modules.Generator import sample, sampleBatch, toBackend
+from Modules.Sampler import Sampler
+from Modules.UserFileHandler import Filer
+
+
+SAMPLE_CHARS = 400 # Characters sampled by each sample benchmark, about 35 notes
+BATCH_SOLOS = 16 # Solos sampled together by the batch benchmark
+MIDI_NOTES = 2000 # Notes in the solo written to MIDI, enough that file system noise does not dominate
+
+
+def syntheticNet():
+    '''Returns an untrained net the size trainNSaveRNN trains, over the characters of the note text format'''
+
+    torch.manual_seed(0)
+    chars = sorted(set(BASE_36 + ' !#' + ''.join(chr(pitch + 26) for pitch in range(40, 100))))
+    return CharRNN(chars, n_hidden=512, n_layers=3)
+
+
+def syntheticSolo(n_notes=MIDI_NOTES, seed=0):
+    '''Returns a solo of *n_notes* random notes in the note text format, as generateFromNet returns one'''
+
+    rng = np.random.default_rng(seed)
+    notes, start = [], 0
+    for _ in range(n_notes):
+        start += int(rng.choice([0, 20, 40, 80, 160]))
+        notes.append(noteText(start, int(rng.integers(40, 100)), start + int(rng.choice([20, 40, 80, 160]))))
+    return '### ' + ''.join(note + ' ' for note in notes) + '###'
+
+
+def sampleBenchmarks(repeats=3):
+    '''Returns the benchmarks of sampled characters/sec on the torch and NumPy backends, one solo and a batch of solos at a time'''
+
+    net = syntheticNet()
+    benchmarks = {}
+    for backend in ('torch', 'numpy'):
+        backend_net = toBackend(net, backend)
+        seconds = statistics.median(timeRepeats(
+            lambda: sample(backend_net, SAMPLE_CHARS, constrained=True, sampler=Sampler(seed=0)), repeats))
+        benchmarks['sample.{}'.format(backend)] = benchmark(SAMPLE_CHARS / seconds, 'chars/s', higher_is_better=True,
+                                                            repeats=repeats, detail={'seconds': seconds})
+
+    sampled = []
+    def batch():
+        solos = sampleBatch(net, BATCH_SOLOS, SAMPLE_CHARS, constrained=True, sampler=Sampler(seed=0))
+        sampled[:] = [sum(len(solo) - 4 for solo in solos)] # Characters sampled after the prime
+    seconds = statistics.median(timeRepeats(batch, repeats))
+    benchmarks['sample_batch.{}'.format(BATCH_SOLOS)] = benchmark(sampled[0] / seconds, 'chars/s', higher_is_better=True,
+                                                                  repeats=repeats, detail={'seconds': seconds, 'chars': sampled[0]})
+    return benchmarks
+
+
+def midiWriteBenchmarks(repeats=20):
+    '''Returns the benchmarks of turning a sampled solo into a MIDI file, all at once and streamed a note at a time'''
+
+    solo = syntheticSolo()
+    notes = solo[4:-4].split()
+    benchmarks = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()): # Filer prints each save
+        filer = Filer('x.txt', os.path.join(directory, 'benchmark.mid'))
+        def finish():
+            filer.finishFinalMidi(*filer.generatedToNums(solo))
+        def stream():
+            filer.writeMidiStream(filer.notesToNums(notes))
+        for name, write in (('midi_write.finish', finish), ('midi_write.stream', stream)):
+            seconds = min(timeRepeats(write, repeats))
+            benchmarks[name] = benchmark(seconds, 's/solo', tolerance=0.5, repeats=repeats, detail={'notes': MIDI_NOTES})
+    return benchmarks
+
+
+def userBenchmarks():
+    '''Returns every User benchmark'''
+
+    benchmarks = sampleBenchmarks()
+    benchmarks.update(midiWriteBenchmarks())
+    return benchmarks
+
+
+# Only run if this is the main program running
+if __name__ == '__main__':
+
+    runFromCommandLine('user', userBenchmarks)
@@ -4,8 +4,63 @@
 
 import py_midicsv
 import pickle
+import struct
+import heapq
+import itertools
 import os
 
+from Modules.EventTokens import EVENT_FORMAT, eventsToNotes
+
+
+# Header chunk and full first track (tempo, key, title and time signature) as written from BeginningGenMidi.txt
+MIDI_HEADER = (b'MThd' + struct.pack('>LHHH', 6, 1, 2, 960) +
+               b'MTrk' + struct.pack('>L', 37) +
+               b'\x00\xff\x51\x03\x05\x57\x30' + # Tempo, 350000
+               b'\x00\xff\x59\x02\x00\x00' + # Key_signature, 0, "major"
+               b'\x00\xff\x03\x08Untitled' + # Title_t
+               b'\x00\xff\x58\x04\x04\x02\x18\x08' + # Time_signature, 4, 2, 24, 8
+               b'\x00\xff\x2f\x00') # End_track
+
+# Settings messages at the start of the solo track, before any note
+SOLO_TRACK_PREFIX = (b'\x00\xb0\x00\x00' + # Control_c, 0, 0, 0
+                     b'\x00\x20\x00' + # Control_c, 0, 32, 0 (running status)
+                     b'\x00\xc0\x1d' + # Program_c, 0, 29
+                     b'\x00\xff\x03\x08Untitled' + # Title_t
+                     b'\x00\xb0\x07\x7f') # Control_c, 0, 7, 127
+
+NOTE_ON_STATUS = 0x90
+NOTE_OFF_STATUS = 0x80
+NOTE_ON_VELOCITY = 95
+REORDER_NOTES = 16 # Notes writeMidiStream holds back, so notes sampled a little out of order are written at their own start
+
+
+def reorderNotes(num_notes, depth=REORDER_NOTES):
+    '''
+    Generator yielding the notes of *num_notes* in order of their start tick, holding back up to *depth* notes.
+    A note starting before every note held back yields as soon as *depth* later notes arrive, so only a note
+    more than *depth* notes out of order comes out after a later one. Notes with the same start keep their order.
+    '''
+
+    held = [] # Heap of (start, arrival, note)
+    for arrival, note in enumerate(num_notes):
+        heapq.heappush(held, (note[0], arrival, note))
+        if len(held) > depth:
+            yield heapq.heappop(held)[2]
+    while held:
+        yield heapq.heappop(held)[2]
+
+
+def encodeVarLen(value):
+    '''Returns *value* as a MIDI variable-length quantity'''
+
+    encoded = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        encoded.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(encoded)
+
+
 class Filer():
 
     def __init__(self, fromFile, toFile):
@@ -34,9 +89,14 @@ class Filer():
         return self.toFile
 
 
-    def generatedToNums(self, genText):
-        '''Converts generated text to 2d-array of notes with note information. Returns the 2d-array'''
+    def generatedToNums(self, genText, text_format='notes'):
+        '''
+        Converts generated text to 2d-array of notes with note information. Returns the 2d-array.
+        *text_format* is the text format of the net that generated the text, 'notes' or 'events'.
+        '''
 
+        if text_format == EVENT_FORMAT:
+            return self.eventsToNums(genText[4:].split('###')[0])
         tagless = self.cutTags(genText)
         splitted = self.splitNotes(tagless)
         num_notes, last_note_end= self.reprToNum(splitted)
@@ -46,6 +106,15 @@ class Filer():
     def finishFinalMidi(self, num_notes_in_key, last_note_end):
         '''Takes 2d-array with adjusted note values and saves as MIDI file'''
 
+        messages = self.doubleNoteMessages(num_notes_in_key)
+        sorted_messages = self.mergeSortOnMessages(messages)
+        midi_bytes = self.messagesToMidiBytes(sorted_messages, last_note_end)
+        self.saveMidiBytesAsFile(midi_bytes)
+
+
+    def finishFinalMidiFromCSV(self, num_notes_in_key, last_note_end):
+        '''Takes 2d-array with adjusted note values and saves as MIDI file through py_midicsv'''
+
         messages = self.doubleNoteMessages(num_notes_in_key)
         sorted_messages = self.mergeSortOnMessages(messages)
         on_off_messages = self.convToMidiMessages(sorted_messages)
@@ -54,6 +123,82 @@ class Filer():
         self.saveMidiAsFile(parsed_midi)
 
 
+    def notesToNums(self, notes):
+        '''Generator converting each note text 'start!pitch!end' from *notes* to a note list as reprToNum does'''
+
+        for note in notes:
+            start, pitch, end = note.split('!')
+            yield [self.HextridecToDec(start) * 6, str(ord(pitch)-26), self.HextridecToDec(end) * 6]
+
+
+    def writeMidiStream(self, num_notes):
+        '''
+        Writes the notes from the iterable *num_notes* to the MIDI file as they arrive, so the file grows while the notes
+        are still being generated. Returns the number of notes written.
+
+        Notes pass through reorderNotes(), so the notes of a sampled solo, whose starts are not always in order,
+        are written at their own start as finishFinalMidi() writes them. Only a note out of order by more than
+        REORDER_NOTES notes starts later than its own start, with the events already written.
+        Each note-on is written when its note leaves the reorder buffer and each note-off once a later note starts
+        after it, with note-offs before note-ons on the same tick. Notes that end as they start are skipped,
+        as in doubleNoteMessages.
+
+        The file is written as <file>.part and only renamed to the MIDI file once it is complete, so a failure or
+        an interrupt while generating leaves no half-written solo behind.
+        '''
+
+        num_notes = reorderNotes(num_notes)
+        first = next(num_notes, None)
+        if first is None:
+            raise ValueError('No notes to write.')
+
+        part_path = self.get_toFile() + '.part'
+        try:
+            written = self.writeMidiTrack(part_path, itertools.chain([first], num_notes))
+            os.replace(part_path, self.get_toFile())
+        except BaseException: # Also cleans up after Ctrl-C
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        print('Midi file saved')
+        return written
+
+
+    def writeMidiTrack(self, path, num_notes):
+        '''Writes the notes from the iterable *num_notes*, in order of their start tick, to the MIDI file at *path* and returns the number written'''
+
+        pending_offs = [] # Heap of (tick, pitch) of note-offs not yet written
+        written = 0
+        with open(path, 'wb') as midi_file:
+            midi_file.write(MIDI_HEADER + b'MTrk' + b'\x00\x00\x00\x00') # Track length is filled in at the end
+            track = bytearray(SOLO_TRACK_PREFIX)
+            tick, running_status = 0, 0xB0 # Left by the final Control_c message of the prefix
+            for start, note, end in num_notes:
+                last_note_end = end
+                start = max(start, tick)
+                while pending_offs and pending_offs[0][0] <= start:
+                    off_tick, pitch = heapq.heappop(pending_offs)
+                    tick, running_status = self.appendNoteMessage(track, [1, off_tick, pitch], tick, running_status)
+                if end <= start:
+                    continue
+                tick, running_status = self.appendNoteMessage(track, [0, start, note], tick, running_status)
+                heapq.heappush(pending_offs, (end, int(note)))
+                written += 1
+                midi_file.write(track)
+                midi_file.flush()
+                track.clear()
+            while pending_offs:
+                off_tick, pitch = heapq.heappop(pending_offs)
+                tick, running_status = self.appendNoteMessage(track, [1, off_tick, pitch], tick, running_status)
+            end_track = max(self.findNextFullBar(last_note_end * 6), tick) # Ends like reprToNum's end_track_on
+            track += encodeVarLen(end_track - tick) + b'\xff\x2f\x00'
+            midi_file.write(track)
+            track_length = midi_file.tell() - len(MIDI_HEADER) - 8
+            midi_file.seek(len(MIDI_HEADER) + 4)
+            midi_file.write(struct.pack('>L', track_length))
+        return written
+
+
     def cutTags(self, generated):
         '''Removes tags and identifies returns a full solo'''
 
@@ -90,6 +235,14 @@ class Filer():
         return num_notes, end_track_on
 
 
+    def eventsToNums(self, events):
+        '''Converts the event text of a solo to a 2d-array of notes like reprToNum and returns it with the track end'''
+
+        num_notes = [[start * 6, str(pitch), end * 6] for start, pitch, end in eventsToNotes(events)]
+        end_track_on = num_notes[-1][-1] * 6
+        return num_notes, end_track_on
+
+
     def HextridecToDec(self, hexatridecimal):
         '''Converts hexatridecimal value to integer value'''
 
@@ -180,6 +333,37 @@ class Filer():
         return full_CSV_midi
         
 
+    def messagesToMidiBytes(self, messages, last_note_end):
+        '''Returns the full MIDI file as bytes for sorted *messages*, ending the track on the next full bar'''
+
+        track = bytearray(SOLO_TRACK_PREFIX)
+        running_status = 0xB0 # Left by the final Control_c message of the prefix
+        tick = 0
+        for message in messages:
+            tick, running_status = self.appendNoteMessage(track, message, tick, running_status)
+        end_track = max(self.findNextFullBar(last_note_end), tick) # Never give End_track a negative delta
+        track += encodeVarLen(end_track - tick) + b'\xff\x2f\x00'
+        return MIDI_HEADER + b'MTrk' + struct.pack('>L', len(track)) + bytes(track)
+
+
+    def appendNoteMessage(self, track, message, tick, running_status):
+        '''
+        Appends the note *message* [0 for on or 1 for off, tick, pitch] to the bytearray *track*,
+        following the event at *tick* with *running_status*. Returns the new tick and running status.
+        '''
+
+        if message[0] == 0:
+            status, velocity = NOTE_ON_STATUS, NOTE_ON_VELOCITY
+        else:
+            status, velocity = NOTE_OFF_STATUS, 0
+        track += encodeVarLen(message[1] - tick)
+        if status != running_status:
+            track.append(status)
+        track.append(int(message[2]))
+        track.append(velocity)
+        return message[1], status
+
+
     def findNextFullBar(self, last_note_end):
         '''Returns the next full bar on which the track and file will end'''
 
@@ -217,6 +401,14 @@ class Filer():
             print('Midi file saved')
 
 
+    def saveMidiBytesAsFile(self, midi_bytes):
+        '''Save MIDI bytes to disk'''
+
+        with open(self.get_toFile(), "wb") as midi_file:
+            midi_file.write(midi_bytes)
+            print('Midi file saved')
+
+
     def removeFile(self):
         '''Removes file'''
         os.remove(self.get_fromFile())
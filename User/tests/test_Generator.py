@@ -0,0 +1,68 @@
+'''
+    Tests of the bar limit of streamNotes and sampleBatch
+
+    Run from the User directory with:
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import unittest
+
+import torch
+
+USER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, USER_DIR)
+
+from Modules.CharacterRNN import CharRNN
+from Modules.EventTokens import BASE_36, DELTA_BASE, DURATION_BASE, EVENT_FORMAT, TICK_BUCKETS, toNoteText
+from Modules.Generator import streamNotes, sampleBatch
+from Modules.Sampler import Sampler
+from Modules.UserFileHandler import Filer
+
+
+PITCHES = ''.join(chr(pitch + 26) for pitch in range(40, 100))
+
+
+def untrainedNet(text_format):
+    '''Returns a small untrained net over the characters of *text_format*'''
+
+    torch.manual_seed(0)
+    if text_format == EVENT_FORMAT:
+        chars = sorted(set('# ' + PITCHES + ''.join(chr(base + ii) for base in (DELTA_BASE, DURATION_BASE)
+                                                     for ii in range(len(TICK_BUCKETS)))))
+    else:
+        chars = sorted(set(BASE_36 + ' !#' + PITCHES))
+    net = CharRNN(chars, n_hidden=32, n_layers=1)
+    net.text_format = text_format
+    return net
+
+
+class BarLimitTest(unittest.TestCase):
+    '''With max_bars=0 every note starts too late, the first one included, which a solo must still keep'''
+
+    def setUp(self):
+        self.filer = Filer('x.txt', 'x.mid')
+
+    def test_stream_keeps_a_late_first_note(self):
+        for text_format in ('notes', EVENT_FORMAT):
+            for backend in ('torch', 'numpy'):
+                with self.subTest(text_format=text_format, backend=backend):
+                    notes = list(streamNotes(untrainedNet(text_format), 1500, max_bars=0, backend=backend, sampler=Sampler(seed=0)))
+                    self.assertEqual(len(notes), 1)
+                    solo = '### ' + notes[0] + ' ###'
+                    self.assertEqual(len(self.filer.generatedToNums(solo)[0]), 1)
+
+    def test_batch_keeps_a_late_first_note(self):
+        for text_format in ('notes', EVENT_FORMAT):
+            with self.subTest(text_format=text_format):
+                solos = sampleBatch(untrainedNet(text_format), 4, 1500, constrained=True, max_bars=0, sampler=Sampler(seed=0))
+                for solo in solos:
+                    if text_format == EVENT_FORMAT:
+                        solo = toNoteText(solo)
+                    self.assertEqual(len(solo[4:-4].split()), 1, solo)
+                    self.assertEqual(len(self.filer.generatedToNums(solo)[0]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()